@@ -0,0 +1,61 @@
+import re
+
+
+MAX_GAMES = 12
+
+# "name: games", "name, games", "name = games" or "name<TAB>games"
+_LINE = re.compile(r"^\s*(?P<name>.+?)\s*[:,=\t]\s*(?P<games>[^:,=\t]*?)\s*$")
+_HEADERS = {"name", "username", "player", "user"}
+
+
+def parse_availability(text: str):
+    """Parse a pasted block or CSV of `name: games` lines (or `;`-separated entries).
+
+    Returns (entries, errors): entries is a list of (name, games) in input
+    order, errors a list of human-readable problems with line numbers.
+    """
+    entries = []
+    errors = []
+    # ";" separates entries too, for single-line input such as slash-command options
+    for line_no, raw in enumerate(text.replace(";", "\n").splitlines(), 1):
+        line = raw.strip()
+        if not line or line.startswith("#"):
+            continue
+        match = _LINE.match(line)
+        if match is None:
+            errors.append(f"Line {line_no}: expected `name: games`, got `{line}`")
+            continue
+        name = match.group("name").strip().strip('"')
+        games = match.group("games").strip().strip('"')
+        if not entries and not errors and name.lower() in _HEADERS:
+            continue  # CSV header row
+        if not games.isdigit() or int(games) > MAX_GAMES:
+            errors.append(f"Line {line_no}: games for `{name}` must be a number from 0-{MAX_GAMES}")
+            continue
+        entries.append((name, int(games)))
+    return entries, errors
+
+
+def resolve_availability(entries, find_player):
+    """Resolve every parsed name in one pass.
+
+    find_player(name) returns the [(player_id, player)] matches, like
+    find_player_by_name. Returns ({player_id: (player, games)}, errors).
+    """
+    resolved = {}
+    errors = []
+    for name, games in entries:
+        matches = find_player(name)
+        if not matches:
+            errors.append(f"No player found matching `{name}`")
+            continue
+        if len(matches) > 1:
+            names = ", ".join(player.username for _, player in matches[:5])
+            errors.append(f"`{name}` matches several players ({names}); be more specific")
+            continue
+        player_id, player = matches[0]
+        if player_id in resolved:
+            errors.append(f"{player.username} is listed more than once")
+            continue
+        resolved[player_id] = (player, games)
+    return resolved, errors
@@ -0,0 +1,118 @@
+import asyncio
+import itertools
+
+
+# Discord-shaped stand-ins with just the attributes the commands touch.
+# No network, no gateway: commands run against them exactly as they would
+# against a live guild, and everything they send is counted and dropped.
+_ids = itertools.count(10**17)
+
+
+# ---------------- Guild Objects ---------------- #
+class FakeRole:
+    def __init__(self, guild, name: str):
+        self.id = next(_ids)
+        self.name = name
+        self.guild = guild
+
+    def __repr__(self):
+        return f"<FakeRole {self.name}>"
+
+
+class FakeMember:
+    def __init__(self, guild, name: str, member_id: int = None):
+        self.id = next(_ids) if member_id is None else member_id
+        self.name = name
+        self.display_name = name
+        self.guild = guild
+        self.roles = []
+
+    async def add_roles(self, *roles, reason: str = None):
+        self.roles.extend(roles)
+
+    def __repr__(self):
+        return f"<FakeMember {self.name}>"
+
+
+class FakeGuild:
+    def __init__(self, guild_id: int):
+        self.id = guild_id
+        self.members = []
+        self.roles = []
+        self._members = {}
+
+    def add_member(self, name: str) -> FakeMember:
+        member = FakeMember(self, name)
+        self.members.append(member)
+        self._members[member.id] = member
+        return member
+
+    def add_role(self, name: str) -> FakeRole:
+        role = FakeRole(self, name)
+        self.roles.append(role)
+        return role
+
+    def get_member(self, member_id: int):
+        return self._members.get(member_id)
+
+
+class FakeChannel:
+    def __init__(self, channel_id: int = 1):
+        self.id = channel_id
+
+
+# ---------------- Messages ---------------- #
+class FakeAttachment:
+    def __init__(self, filename: str, data: bytes):
+        self.filename = filename
+        self._data = data
+
+    async def read(self) -> bytes:
+        return self._data
+
+
+class FakeMessage:
+    def __init__(self, content: str = "", author=None, channel=None, attachments=()):
+        self.content = content
+        self.author = author
+        self.channel = channel
+        self.attachments = list(attachments)
+
+
+class FakeBot:
+    """Answers wait_for from a queue of scripted replies; with none left it waits out the timeout"""
+
+    def __init__(self):
+        self.replies = []
+
+    async def wait_for(self, event: str, timeout: float = None, check=None):
+        while self.replies:
+            message = self.replies.pop(0)
+            if check is None or check(message):
+                return message
+        if timeout is None:
+            await asyncio.get_running_loop().create_future()  # never answered; the caller cancels it
+        raise asyncio.TimeoutError()
+
+
+class FakeContext:
+    """A command invocation by `author` in `channel`; replies are counted, the last one kept"""
+
+    def __init__(self, guild: FakeGuild, author: FakeMember, bot: FakeBot = None, channel: FakeChannel = None):
+        self.guild = guild
+        self.author = author
+        self.bot = bot or FakeBot()
+        self.channel = channel or FakeChannel()
+        self.message = FakeMessage(author=author, channel=self.channel)
+        self.league = None
+        self.sent = 0
+        self.last_sent = None
+
+    def reply_with(self, *contents: str):
+        """Queue what the author types next, for commands that prompt"""
+        self.bot.replies.extend(FakeMessage(text, self.author, self.channel) for text in contents)
+
+    async def send(self, content: str = None, **kwargs):
+        self.sent += 1
+        self.last_sent = (content, kwargs)
+        return FakeMessage(content or "", channel=self.channel)
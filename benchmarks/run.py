@@ -0,0 +1,309 @@
+"""Offline benchmarks: drive the bot's command coroutines against synthetic leagues.
+
+    python benchmarks/run.py                              # 100, 1k, 10k and 100k players
+    python benchmarks/run.py --sizes 1000 --runs 200 -o bench.json
+    python benchmarks/run.py --baseline old.json          # compare p50s with an earlier run
+
+For every league size and command this reports p50/p99 latency, peak
+traced allocation per call (tracemalloc) and bytes written to the shard,
+and writes the lot to a JSON file. Commands run through the same
+acquire_league/release_league hooks the bot uses, against fakes from
+fakes.py, with data in a throwaway DATA_DIR. STORAGE_BACKEND and the
+other persistence settings are honoured, so backends can be compared.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+# ---------------- Settings ---------------- #
+DEFAULT_SIZES = [100, 1000, 10000, 100000]
+DEFAULT_TEAMS = 1000
+# Slow commands get fewer runs
+RUN_LIMITS = {"load": 5, "rosters": 10, "importplayers": 20, "rebuildratings": 5}
+# Players per importplayers file and matches per recordmatches night
+IMPORT_BATCH = 10
+NIGHT_MATCHES = 10
+
+
+def configure(data_dir: str):
+    """Point persistence at data_dir and take timers out of the measurements; must run before the bot's imports"""
+    os.environ["DATA_DIR"] = data_dir
+    os.environ.setdefault("FLUSH_DELAY", "0")
+    # One journal per run, so bytes written are just the appended entries
+    os.environ.setdefault("JOURNAL_MAX_BYTES", str(1 << 40))
+    # Fake members answer add_roles instantly; don't wait out the rate limit
+    os.environ.setdefault("ROLE_UPDATES_PER_SECOND", "0")
+
+
+def percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    rank = math.ceil(pct / 100 * len(ordered)) - 1
+    return ordered[min(max(rank, 0), len(ordered) - 1)]
+
+
+def directory_bytes(directory: str) -> int:
+    return sum(entry.stat().st_size for entry in os.scandir(directory) if entry.is_file())
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# ---------------- Scenarios ---------------- #
+def scenarios(bot, guild, teams: int):
+    """(name, call(ctx, i)) for every benchmarked command; call i gets fresh arguments"""
+    c = bot.commands
+    from fakes import FakeAttachment
+    from synthetic import NEW_TEAM_NAME, NEWCOMER_NAME, PLAYER_NAME, TEAM_NAME
+
+    players = [m.name for m in guild.members if m.name.startswith("player")]
+
+    def player(i):
+        return players[(i * 7919) % len(players)]
+
+    def team(i):
+        return TEAM_NAME.format(i % teams)
+
+    async def recordmatch(ctx, i):
+        # team i's and team i+1's first players; the teams' first members are players i and i+1
+        winner, loser = i % teams, (i + 1) % teams
+        await c.recordmatch(ctx, team(winner), team(loser),
+                                     players=f"{PLAYER_NAME.format(winner)} | {PLAYER_NAME.format(loser)}")
+
+    async def recordmatches(ctx, i):
+        lines = []
+        for n in range(i * NIGHT_MATCHES, (i + 1) * NIGHT_MATCHES):
+            winner, loser = n % teams, (n + 1) % teams
+            lines.append(f"{team(winner)} {team(loser)} {PLAYER_NAME.format(winner)} | {PLAYER_NAME.format(loser)}")
+        await c.recordmatches(ctx, results="\n".join(lines))
+
+    async def importplayers(ctx, i):
+        # Newcomers not yet registered: addplayer's have all been deleted again by now
+        rows = [f"{NEWCOMER_NAME.format(n)},,{team(n)}" for n in range(i * IMPORT_BATCH, (i + 1) * IMPORT_BATCH)]
+        ctx.message.attachments.append(FakeAttachment("players.csv", "\n".join(rows).encode()))
+        await c.importplayers(ctx)
+
+    async def rosters(ctx, i):
+        members = players[i % teams::teams][:12]
+        availability = "\n".join(f"{name}: {3 + n % 4}" for n, name in enumerate(members))
+        await c.rosters(ctx, team(i), availability=availability)
+
+    return [
+        ("playerstats", lambda ctx, i: c.playerstats(ctx, player(i))),
+        ("players", lambda ctx, i: c.players(ctx, 1 + i % 20, "winrate")),
+        ("players_rating", lambda ctx, i: c.players(ctx, 1 + i % 20, "rating")),
+        ("teams", lambda ctx, i: c.teams(ctx, 1 + i % 20)),
+        ("teamstats", lambda ctx, i: c.teamstats(ctx, team(i), 1, "winrate")),
+        ("addplayer", lambda ctx, i: c.addplayer(ctx, NEWCOMER_NAME.format(i), None, team(i))),
+        ("editplayer", lambda ctx, i: c.editplayer(ctx, player(i), i % 60, None, None)),
+        ("recordmatch", recordmatch),
+        ("deleteplayer", lambda ctx, i: c.deleteplayer(ctx, NEWCOMER_NAME.format(i))),
+        ("rosters", rosters),
+        ("exportrosters", lambda ctx, i: c.exportrosters(ctx, team(i), "csv")),
+        ("recordmatches", recordmatches),
+        ("importplayers", importplayers),
+        # New teams borrow an existing team's role; deleteteam removes the same (empty) teams again
+        ("addteam", lambda ctx, i: c.addteam(ctx, NEW_TEAM_NAME.format(i), team(i))),
+        ("deleteteam", lambda ctx, i: c.deleteteam(ctx, NEW_TEAM_NAME.format(i))),
+        ("rebuildratings", lambda ctx, i: c.rebuildratings(ctx)),
+    ]
+
+
+async def measure(bot, guild, league, call, runs: int, traced: int):
+    """Latencies, bytes written and per-call peak allocations for runs + traced calls of one command"""
+    from fakes import FakeContext
+
+    directory = league.service.directory
+    author = guild.members[0]
+    latencies = []
+    written = 0
+    for i in range(runs):
+        ctx = FakeContext(guild, author)
+        before = directory_bytes(directory)
+        start = time.perf_counter()
+        await bot.acquire_league(ctx)
+        try:
+            await call(ctx, i)
+        finally:
+            await bot.release_league(ctx)
+        latencies.append(time.perf_counter() - start)
+        await league.service.flush()
+        written += directory_bytes(directory) - before
+
+    # Allocations are traced in separate calls; tracing slows everything down
+    peaks = []
+    tracemalloc.start()
+    try:
+        for i in range(runs, runs + traced):
+            ctx = FakeContext(guild, author)
+            await bot.acquire_league(ctx)
+            base = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            try:
+                await call(ctx, i)
+            finally:
+                await bot.release_league(ctx)
+            peaks.append(tracemalloc.get_traced_memory()[1] - base)
+            await league.service.flush()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "runs": runs,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "mean_ms": round(sum(latencies) / runs * 1000, 3),
+        "alloc_peak_kb": round(percentile(peaks, 50) / 1024, 1) if peaks else None,
+        "bytes_written": round(written / runs)
+    }
+
+
+async def measure_load(bot, guild_id: int, runs: int):
+    """Cold load of one shard, as a guild's first command would trigger it"""
+    latencies = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        league = await asyncio.to_thread(bot.League.load, guild_id)
+        latencies.append(time.perf_counter() - start)
+        await league.service.close()
+    return {
+        "runs": runs,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "mean_ms": round(sum(latencies) / runs * 1000, 3),
+        "alloc_peak_kb": None,
+        "bytes_written": 0
+    }
+
+
+async def bench_size(bot, data_dir: str, players: int, teams: int, runs: int, traced: int):
+    from synthetic import build_league, team_count
+
+    teams = team_count(players, teams)
+    guild_id = players
+    newcomers = max(max(runs, *RUN_LIMITS.values()) + traced,
+                    (min(runs, RUN_LIMITS["importplayers"]) + traced) * IMPORT_BATCH)
+    started = time.perf_counter()
+    guild = build_league(os.path.join(data_dir, str(guild_id)), guild_id, players, teams, newcomers)
+    print(f"\n▶ {players} players, {teams} teams (generated in {time.perf_counter() - started:.1f}s)")
+
+    results = [dict(command="load", **await measure_load(bot, guild_id, RUN_LIMITS["load"]))]
+    league = await bot.leagues.acquire(guild_id)   # held for the whole size, so it is never evicted
+    try:
+        for name, call in scenarios(bot, guild, teams):
+            result = await measure(bot, guild, league, call, min(runs, RUN_LIMITS.get(name, runs)), traced)
+            results.append(dict(command=name, **result))
+    finally:
+        bot.leagues.release(league)
+        await bot.leagues.close()
+
+    for result in results:
+        result.update(players=players, teams=teams)
+        print(f"  {result['command']:<15} p50 {result['p50_ms']:>9.2f} ms  p99 {result['p99_ms']:>9.2f} ms  "
+              f"alloc {result['alloc_peak_kb'] if result['alloc_peak_kb'] is not None else '-':>8} KB  "
+              f"wrote {result['bytes_written']:>6} B")
+    return results
+
+
+def compare(results, baseline_path: str):
+    """Print the p50 change of every (size, command) also present in the baseline file"""
+    with open(baseline_path, "r") as f:
+        baseline = {(r["players"], r["command"]): r for r in json.load(f)["results"]}
+    print(f"\n📊 Against {baseline_path}:")
+    for result in results:
+        old = baseline.get((result["players"], result["command"]))
+        if old is None or not old["p50_ms"]:
+            continue
+        change = (result["p50_ms"] - old["p50_ms"]) / old["p50_ms"] * 100
+        flag = " ⚠️" if change > 20 else ""
+        print(f"  {result['players']:>7} {result['command']:<15} {old['p50_ms']:>9.2f} → {result['p50_ms']:>9.2f} ms "
+              f"({change:+.0f}%){flag}")
+
+
+# ---------------- Main ---------------- #
+class _Bot:
+    """The bot modules, imported only after configure()"""
+
+    def __init__(self):
+        import commands
+        import persistence
+        import roster_pool
+        from league import League, acquire_league, leagues, release_league
+
+        self.commands = commands
+        self.persistence = persistence
+        self.roster_pool = roster_pool
+        self.League = League
+        self.leagues = leagues
+        self.acquire_league = acquire_league
+        self.release_league = release_league
+
+
+async def run(args):
+    data_dir = tempfile.mkdtemp(prefix="league-bench-")
+    configure(data_dir)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    bot = _Bot()
+
+    results = []
+    try:
+        for players in args.sizes:
+            results += await bench_size(bot, data_dir, players, args.teams, args.runs, args.traced)
+    finally:
+        bot.persistence.shutdown()
+        bot.roster_pool.shutdown()
+        if not args.keep_data:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "backend": bot.persistence.STORAGE_BACKEND,
+            "runs": args.runs,
+            "traced": args.traced,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z")
+        },
+        "results": results
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Results written to {args.output}" + (f" (data kept in {data_dir})" if args.keep_data else ""))
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=lambda s: [int(n) for n in s.split(",")], default=DEFAULT_SIZES,
+                        help="comma-separated player counts (default: 100,1000,10000,100000)")
+    parser.add_argument("--teams", type=int, default=DEFAULT_TEAMS, help="teams per league, at most players/10")
+    parser.add_argument("--runs", type=int, default=100, help="timed calls per command")
+    parser.add_argument("--traced", type=int, default=5, help="extra calls per command under tracemalloc")
+    parser.add_argument("-o", "--output", default="bench-results.json")
+    parser.add_argument("--baseline", help="an earlier results file to compare against")
+    parser.add_argument("--keep-data", action="store_true", help="leave the synthetic shards on disk")
+    asyncio.run(run(parser.parse_args()))
+
+
+# Guarded so roster worker processes (spawned, they re-import this module) don't start a run
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import os
+import random
+
+from fakes import FakeGuild
+from persistence import SNAPSHOT_FILE, write_atomic
+from player_store import TRAINING_ROLES, PlayerStore
+from snapshot import encode_snapshot
+
+
+# Fixed-width names, so every name is a unique substring match for find_player_by_name
+PLAYER_NAME = "player{:06d}"
+NEWCOMER_NAME = "newcomer{:06d}"
+TEAM_NAME = "team{:04d}"
+NEW_TEAM_NAME = "newteam{:04d}"
+
+
+def team_count(players: int, teams: int) -> int:
+    """Teams for a league of this size: the requested count, but at least ~10 players a team"""
+    return max(2, min(teams, players // 10))
+
+
+def build_league(directory: str, guild_id: int, players: int, teams: int, newcomers: int = 0, seed: int = 0):
+    """Write a synthetic league's shard into directory and return the matching FakeGuild.
+
+    Players are dealt round-robin onto `teams` teams with random records,
+    levels and ratings. `newcomers` extra guild members are not registered
+    yet, for addplayer to pick up.
+    """
+    rng = random.Random(seed)
+    guild = FakeGuild(guild_id)
+    team_names = [TEAM_NAME.format(i) for i in range(teams)]
+    for name in team_names + TRAINING_ROLES + ["Spellkeeper"]:
+        guild.add_role(name)
+
+    store = PlayerStore()
+    rosters = {name: {"members": [], "wins": rng.randrange(100), "losses": rng.randrange(100), "role": name}
+               for name in team_names}
+    for i in range(players):
+        member = guild.add_member(PLAYER_NAME.format(i))
+        team = team_names[i % teams]
+        store.add(
+            str(member.id),
+            member.name,
+            wins=rng.randrange(60),
+            losses=rng.randrange(60),
+            team=team,
+            level=rng.randrange(len(TRAINING_ROLES)),
+            rating=rng.gauss(1500, 200),
+            rd=rng.uniform(50, 350)
+        )
+        rosters[team]["members"].append(str(member.id))
+    for i in range(newcomers):
+        guild.add_member(NEWCOMER_NAME.format(i))
+
+    os.makedirs(directory, exist_ok=True)
+    write_atomic(os.path.join(directory, SNAPSHOT_FILE), encode_snapshot(store, rosters))
+    return guild
@@ -0,0 +1,81 @@
+import os
+import time
+
+from dotenv import dotenv_values
+
+
+# Seconds a (channel, user) pair stays quiet after a "wrong channel" notice
+REJECTION_COOLDOWN_SECONDS = float(os.getenv("REJECTION_COOLDOWN_SECONDS", "30"))
+
+
+def _ids(text: str):
+    return frozenset(int(part) for part in text.replace(" ", "").split(",") if part)
+
+
+# ---------------- Channel Policy ---------------- #
+class ChannelPolicy:
+    """Which channels commands may run in, as one frozenset per guild.
+
+    ALLOWED_CHANNEL_IDS (comma-separated) applies to every guild, as it
+    always has; GUILD_CHANNEL_IDS ("guild:chan,chan;guild:chan") gives
+    individual guilds their own list instead. With neither set every
+    channel is allowed. reload() re-reads both from .env (falling back to
+    `environ`), so the lists can change without a restart. load_dotenv()
+    copies .env into os.environ, so the bot sets `environ` to the
+    environment as it was before that; otherwise a setting deleted from
+    .env would live on in the copy.
+    """
+
+    def __init__(self, environ=os.environ):
+        self.environ = environ
+        self.default = None    # frozenset, or None for "everywhere"
+        self.guilds = {}       # guild id -> frozenset
+        self.reload()
+
+    def _setting(self, name: str, file_values: dict) -> str:
+        value = file_values.get(name)
+        return value if value is not None else self.environ.get(name, "")
+
+    def reload(self):
+        """Rebuild the sets from the current settings; returns (default channels, guilds configured)"""
+        file_values = dotenv_values()
+        default = _ids(self._setting("ALLOWED_CHANNEL_IDS", file_values))
+        guilds = {}
+        for rule in self._setting("GUILD_CHANNEL_IDS", file_values).split(";"):
+            if ":" in rule:
+                guild_id, channels = rule.split(":", 1)
+                guilds[int(guild_id)] = _ids(channels)
+        # Swapped in whole, so a check never sees half a reload
+        self.default, self.guilds = default or None, guilds
+        return len(default), len(guilds)
+
+    def allows(self, guild_id, channel_id: int) -> bool:
+        channels = self.guilds.get(guild_id, self.default)
+        return channels is None or channel_id in channels
+
+    @property
+    def restricted(self) -> bool:
+        return self.default is not None or bool(self.guilds)
+
+
+# ---------------- Notice Cooldown ---------------- #
+class NoticeCooldown:
+    """Lets one notice per key through every `seconds`; the rest are dropped without an API call"""
+
+    def __init__(self, seconds: float = REJECTION_COOLDOWN_SECONDS, max_keys: int = 10000):
+        self.seconds = seconds
+        self.max_keys = max_keys
+        self._until = {}    # key -> monotonic time the key may be notified again
+
+    def ready(self, key) -> bool:
+        now = time.monotonic()
+        if self._until.get(key, 0.0) > now:
+            return False
+        if len(self._until) >= self.max_keys:
+            # Drop expired keys so spam from many users can't grow this without bound
+            self._until = {k: until for k, until in self._until.items() if until > now}
+        self._until[key] = now + self.seconds
+        return True
+
+
+channel_policy = ChannelPolicy()
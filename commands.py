@@ -1,70 +1,131 @@
 import discord
 from discord.ext import commands
 from discord.ext.commands import has_role
-import json
-import os
-import time
+from discord import app_commands
 import asyncio
+from itertools import islice
+from typing import Optional
+
+from league import leagues
+from metrics import metrics
+from channel_policy import channel_policy
+from indexes import MemberIndex, NameIndex
+from pagination import PAGE_SIZE, page_count, send_paginated
+from roster_pool import RosterBusy, solve_in_pool
+from availability import parse_availability, resolve_availability
+from roles import RoleCache, RolePipeline
+from player_import import parse_player_rows
+from exports import EXPORT_FORMATS, build_export
+from player_store import COUNT_MAX, TRAINING_ROLES
+from ratings import RATING_RD_START, RATING_START, replay
 
 
-# ---------------- Persistence Helpers ---------------- #
-DATA_FILE = "stats.json"
-
-def load_data():
-    if os.path.exists(DATA_FILE):
-        with open(DATA_FILE, "r") as f:
-            return json.load(f)
-    return {"players": {}, "TEAMS": {}, "training_levels": {}}
+#--------------Other Helpers--------------#
+# Per-guild index over Discord member names; kept in sync by the listeners below
+member_index = MemberIndex()
+
+def find_members_by_name(guild, name: str):
+    return member_index.search(guild, name)
+
+# Role lookups by name, dropped per guild on role create/update/delete
+role_cache = RoleCache()
+# Merges a member's pending role additions into one rate-limited add_roles call
+role_pipeline = RolePipeline()
+
+# The ways players can be sorted, by the name users type
+SORT_ORDERS = {"winrate": "win_rate", "rating": "rating"}
+
+#---------------------------Autocomplete--------------------------------#
+# Slash-command choices come from the league's name indexes: a bisect over
+# the sorted names, topped up with substring matches, so every keystroke is
+# answered well inside Discord's time limit.
+AUTOCOMPLETE_LIMIT = 25  # the most choices Discord shows
+
+def _complete(index, current: str):
+    keys = index.complete(current, AUTOCOMPLETE_LIMIT)
+    if len(keys) < AUTOCOMPLETE_LIMIT and len(current) >= NameIndex.N:
+        seen = set(keys)
+        keys += [key for key in index.search(current)[:AUTOCOMPLETE_LIMIT] if key not in seen]
+    return keys[:AUTOCOMPLETE_LIMIT]
+
+async def player_autocomplete(interaction: discord.Interaction, current: str):
+    # A cold guild gets no choices while its shard loads in the background, rather than a missed deadline
+    league = leagues.loaded(interaction.guild_id) if interaction.guild_id is not None else None
+    if league is None:
+        return []
+    names = [league.player_stats[player_id].username for player_id in _complete(league.name_index, current)]
+    return [app_commands.Choice(name=name, value=name) for name in names]
+
+async def team_autocomplete(interaction: discord.Interaction, current: str):
+    league = leagues.loaded(interaction.guild_id) if interaction.guild_id is not None else None
+    if league is None:
+        return []
+    return [app_commands.Choice(name=name, value=name) for name in _complete(league.team_index, current)]
+
+async def sort_autocomplete(interaction: discord.Interaction, current: str):
+    return [app_commands.Choice(name=name, value=name) for name in SORT_ORDERS if name.startswith(current.lower())]
+
+#---------------------------Member Index Events-------------------------#
+async def on_guild_available(guild):
+    member_index.build(guild)
+
+async def on_guild_join(guild):
+    member_index.build(guild)
+
+async def on_guild_remove(guild):
+    member_index.drop(guild.id)
+
+async def on_member_join(member):
+    member_index.add(member)
+
+async def on_member_remove(member):
+    member_index.remove(member)
+
+async def on_user_update(before, after):
+    # Username changes arrive here, not as on_member_update; re-index in every guild we share
+    for guild in after.mutual_guilds:
+        member = guild.get_member(after.id)
+        if member is not None:
+            member_index.add(member)
+
+#---------------------------Role Cache Events---------------------------#
+async def on_guild_role_create(role):
+    role_cache.invalidate(role.guild.id)
+
+async def on_guild_role_update(before, after):
+    role_cache.invalidate(after.guild.id)
+
+async def on_guild_role_delete(role):
+    role_cache.invalidate(role.guild.id)
+
+#---------------------------Player Helpers------------------------------#
+# Training levels by lowercased name, so "wizard" finds the Wizard role
+LEVELS_BY_NAME = {name.lower(): name for name in TRAINING_ROLES}
+
+async def assign_player_roles(guild, user, team_role: str, level_name: str):
+    """Team, level and Spellkeeper roles go out as one add_roles call"""
+    await role_pipeline.add_roles(
+        user,
+        role_cache.get(guild, team_role),
+        role_cache.get(guild, level_name),
+        role_cache.get(guild, "Spellkeeper")
+    )
 
-def save_data():
-    with open(DATA_FILE, "w") as f:
-        json.dump({
-            "players": player_stats,
-            "TEAMS": team_stats,
-            "training_levels": training_levels
-        }, f, indent=4)
+#---------------------------Match Helpers-------------------------------#
+# Sent when a result arrives mid-rebuild; checked again under the unit locks, just before committing
+RATINGS_REBUILDING = "⏳ Ratings are being rebuilt. Please try again in a moment."
 
-_data = load_data()
-player_stats = _data.get("players", {})       
-team_stats = _data.get("TEAMS", {})           
-training_levels = _data.get("training_levels", {})
+def _match_summary(league, event):
+    def names(ids):
+        return ", ".join(league.player_stats[p].username for p in ids if p in league.player_stats) or "—"
+    return (f"#{event['id']} **{event['winner']}** beat **{event['loser']}** "
+            f"({names(event['winners'])} vs {names(event['losers'])})")
 
-#--------------Other Helpers--------------#
-def find_player_by_name(name: str):
-    matches = []
-    for player_id, record in player_stats.items():
-        username = record["username"].lower()
-        if name.lower() in username:
-            matches.append((player_id, record))
-    return matches
-
-#---------------------------Variables-----------------------------------#
-TRAINING_ROLES = ["Apprentice", "Wizard", "Sage"]
-
-#---------------------------Player Class--------------------------------#
-class Player:
-    def __init__(self, username: str, wins: int = 0, losses: int = 0, level: int = 0):
-        self.username = username
-        self.wins = wins
-        self.losses = losses
-        self.level = level
-
-    @property
-    def training_role(self):
-        return TRAINING_ROLES[self.level]
-
-    def win_percent(self):
-        total = self.wins + self.losses
-        return (self.wins / total) * 100 if total > 0 else 0
-
-    def record_win(self):
-        self.wins += 1
-
-    def record_loss(self):
-        self.losses += 1
-
-    def __repr__(self):
-        return f"<Player {self.username}: {self.wins}-{self.losses}, {self.win_percent():.1f}% WR>"
+def _error_list(errors, limit=15):
+    shown = "\n".join(f"• {e}" for e in errors[:limit])
+    if len(errors) > limit:
+        shown += f"\n…and {len(errors) - limit} more"
+    return shown
 
 #---------------------------BOT COMMANDS--------------------------------#
 @commands.command()
@@ -73,48 +134,67 @@ async def ping(ctx):
 
 # ------------- Add Team Command ------------- #
 @commands.command()
+@commands.guild_only()
 async def addteam(ctx, team_name: str, role_name: str):
     """Create a new team with a specified Discord role"""
-    if team_name in team_stats:
-        await ctx.send(f"Team {team_name} already exists!")
-        return
+    league = ctx.league
+    async with league.unit(teams=[team_name]) as unit:
+        if team_name in league.team_stats:
+            await ctx.send(f"Team {team_name} already exists!")
+            return
 
-    role = discord.utils.get(ctx.guild.roles, name=role_name)
-    if role is None:
-        await ctx.send(f"Role {role_name} not found in the server!")
-        return
+        role = role_cache.get(ctx.guild, role_name)
+        if role is None:
+            await ctx.send(f"Role {role_name} not found in the server!")
+            return
 
-    team_stats[team_name] = {
-        "members": [],      # store player IDs as strings
-        "wins": 0,
-        "losses": 0,
-        "role": role_name   # store role name as string
-    }
+        def create():
+            league.team_stats[team_name] = {
+                "members": {},      # player IDs as strings (ordered set; a list on disk)
+                "wins": 0,
+                "losses": 0,
+                "role": role_name   # store role name as string
+            }
+            league.team_index.add(team_name, team_name)
+            league.record_change("TEAMS", team_name)
+        unit.stage(create)
     await ctx.send(f"Team {team_name} created successfully!")
-    save_data()
 
 # ------------ Delete Team Command ------------- #
 @commands.command()
+@commands.guild_only()
 async def deleteteam(ctx, team_name: str):
     """Delete a team and remove all players from it"""
-    if team_name not in team_stats:
-        await ctx.send(f"Team {team_name} does not exist!")
-        return
-
-    # Remove team from all players
-    for player_id in team_stats[team_name]["members"]:
-        if player_id in player_stats:
-            player_stats[player_id]["team"] = None
+    league = ctx.league
+    # A member's team field is guarded by their team's lock, so the team lock covers them all
+    async with league.unit(teams=[team_name]) as unit:
+        if team_name not in league.team_stats:
+            await ctx.send(f"Team {team_name} does not exist!")
+            return
 
-    del team_stats[team_name]
+        def delete():
+            # Remove team from all players
+            for player_id in league.team_stats[team_name]["members"]:
+                if player_id in league.player_stats:
+                    league.player_stats[player_id].team = None
+                    league.record_change("players", player_id)
+
+            league.leaderboard.drop_team(team_name)
+            league.rating_board.drop_team(team_name)
+            league.membership.drop_team(team_name)
+            del league.team_stats[team_name]
+            league.team_index.remove(team_name)
+            league.record_change("TEAMS", team_name)
+        unit.stage(delete)
     await ctx.send(f"🗑️ Team {team_name} deleted successfully!")
-    save_data()
 
 # ------------- Add Player Command ------------- #
 @commands.command()
+@commands.guild_only()
 async def addplayer(ctx, username: str, level: str = None, team: str = None):
     """Add a new player to a team with a training level"""
-    matches = [m for m in ctx.guild.members if username.lower() in m.name.lower()]
+    league = ctx.league
+    matches = find_members_by_name(ctx.guild, username)
     if not matches:
         await ctx.send(f"No user found matching '{username}'.")
         return
@@ -126,266 +206,506 @@ async def addplayer(ctx, username: str, level: str = None, team: str = None):
     user = matches[0]
     player_id = str(user.id)
 
-    for t_name, data in team_stats.items():
-        if player_id in data["members"]:
-            await ctx.send(f"{user.display_name} is already in {t_name}!")
-            return
-
-    if not team_stats:
+    if not league.team_stats:
         await ctx.send("No teams exist! Please create a team first using <addteam>")
         return
 
-    team_name = team if team else list(team_stats.keys())[0]
-    if team_name not in team_stats:
-        await ctx.send(f"Team {team_name} does not exist!")
+    team_name = team if team else next(iter(league.team_stats))
+    # Checked before any lock is taken or role granted
+    level_name = LEVELS_BY_NAME.get((level or TRAINING_ROLES[0]).lower())
+    if level_name is None:
+        await ctx.send(f"❌ Unknown level '{level}'. Levels: {', '.join(TRAINING_ROLES)}")
         return
+    # Checks, roles and the insert happen under the player's and team's locks,
+    # so a second addplayer for the same user waits and then sees them on the team
+    async with league.unit(teams=[team_name], players=[player_id]) as unit:
+        current_team = league.membership.team_of(player_id)
+        if current_team is not None:
+            await ctx.send(f"{user.display_name} is already in {current_team}!")
+            return
 
-    team_stats[team_name]["members"].append(player_id)
-
-    team_role_name = team_stats[team_name]["role"]
-    team_role = discord.utils.get(ctx.guild.roles, name=team_role_name)
-    if team_role:
-        await user.add_roles(team_role)
-
-    level_name = level if level else TRAINING_ROLES[0]
-    level_index = TRAINING_ROLES.index(level_name)
-    training_levels[player_id] = level_index
+        if team_name not in league.team_stats:
+            await ctx.send(f"Team {team_name} does not exist!")
+            return
 
-    level_role = discord.utils.get(ctx.guild.roles, name=level_name)
-    if level_role:
-        await user.add_roles(level_role)
+        await assign_player_roles(ctx.guild, user, league.team_stats[team_name]["role"], level_name)
+        unit.stage(league.store_new_player, user, team_name, TRAINING_ROLES.index(level_name))
 
-    spellkeeper_role = discord.utils.get(ctx.guild.roles, name="Spellkeeper")
-    if spellkeeper_role:
-        await user.add_roles(spellkeeper_role)
+    await ctx.send(f"{user.display_name} added to {team_name} as {level_name}!")
 
-    player_stats[player_id] = {
-        "username": user.name,
-        "wins": 0,
-        "losses": 0,
-        "team": team_name
-    }
+# ------------- Import Players Command ------------- #
+@commands.command()
+@commands.guild_only()
+async def importplayers(ctx):
+    """Add many players at once from an attached CSV or JSON file"""
+    league = ctx.league
+    if not ctx.message.attachments:
+        await ctx.send("📎 Attach a CSV (`username,level,team`) or JSON file of players to import.")
+        return
+    if not league.team_stats:
+        await ctx.send("No teams exist! Please create a team first using <addteam>")
+        return
 
-    await ctx.send(f"{user.display_name} added to {team_name} as {level_name}!")
-    save_data()
+    attachment = ctx.message.attachments[0]
+    rows, failures = parse_player_rows(attachment.filename, await attachment.read())
+    default_team = next(iter(league.team_stats))
+
+    resolved = []
+    for row_no, username, level, team in rows:
+        matches = find_members_by_name(ctx.guild, username)
+        if not matches:
+            failures.append(f"Row {row_no}: no user found matching '{username}'")
+        elif len(matches) > 1:
+            failures.append(f"Row {row_no}: '{username}' matches several users")
+        else:
+            resolved.append((row_no, matches[0], level, team or default_team))
+
+    # Validate every row and add them all in one unit, locking just the players and teams involved
+    valid = []
+    seen = set()
+    async with league.unit(teams={team for *_, team in resolved},
+                           players={str(user.id) for _, user, _, _ in resolved}) as unit:
+        for row_no, user, level, team_name in resolved:
+            player_id = str(user.id)
+            level_name = LEVELS_BY_NAME.get((level or TRAINING_ROLES[0]).lower())
+            if player_id in seen:
+                failures.append(f"Row {row_no}: {user.name} is listed more than once")
+            elif league.membership.team_of(player_id) is not None:
+                failures.append(f"Row {row_no}: {user.name} is already in {league.membership.team_of(player_id)}")
+            elif level_name is None:
+                failures.append(f"Row {row_no}: unknown level '{level}'")
+            elif team_name not in league.team_stats:
+                failures.append(f"Row {row_no}: team {team_name} does not exist")
+            else:
+                seen.add(player_id)
+                valid.append((row_no, user, league.team_stats[team_name]["role"], level_name))
+                unit.stage(league.store_new_player, user, team_name, TRAINING_ROLES.index(level_name))
+
+    # Roles go through the rate-limited pipeline concurrently; one failure doesn't stop the rest
+    results = await asyncio.gather(
+        *(assign_player_roles(ctx.guild, user, team_role, level_name) for _, user, team_role, level_name in valid),
+        return_exceptions=True
+    )
+    for (row_no, user, _, _), result in zip(valid, results):
+        if isinstance(result, Exception):
+            failures.append(f"Row {row_no}: {user.name} added, but roles failed ({result})")
+
+    summary = f"📥 Imported {len(valid)} of {len(rows)} player(s)."
+    if failures:
+        details = "\n".join(f"• {f}" for f in failures)
+        if len(details) > 1800:
+            details = details[:1800] + "\n…(truncated)"
+        summary += f"\n⚠️ Problems:\n{details}"
+    await ctx.send(summary)
 
 # ------------- Edit Player Command -------------- #
-@commands.command()
+@commands.hybrid_command()
+@commands.guild_only()
+@app_commands.describe(username="The player to edit", wins="New win count", losses="New loss count",
+                       team="Move the player to this team")
+@app_commands.autocomplete(username=player_autocomplete, team=team_autocomplete)
 async def editplayer(ctx, username: str, wins: int = None, losses: int = None, team: str = None):
     """Edit a player's stats or team"""
-    matches = find_player_by_name(username)
+    league = ctx.league
+    matches = league.find_player_by_name(username)
     if not matches:
         await ctx.send(f"No player found matching '{username}'.")
         return
     if len(matches) > 1:
-        names = ", ".join(r["username"] for _, r in matches)
+        names = ", ".join(p.username for _, p in matches)
         await ctx.send(f"Multiple players found: {names}. Please be more specific.")
         return
 
-    player_id, record = matches[0]
-    if wins is not None:
-        record["wins"] = wins
-    if losses is not None:
-        record["losses"] = losses
-    if team is not None:
-        if team not in team_stats:
+    if any(count is not None and not 0 <= count <= COUNT_MAX for count in (wins, losses)):
+        await ctx.send(f"❌ Wins and losses must be between 0 and {COUNT_MAX}.")
+        return
+
+    player_id, player = matches[0]
+    old_team = player.team
+    async with league.unit(teams=[old_team, team], players=[player_id]) as unit:
+        if player_id not in league.player_stats or player.team != old_team:
+            await ctx.send(f"⚠️ {username} was changed by another command. Please try again.")
+            return
+        if team is not None and team not in league.team_stats:
             await ctx.send(f"Team {team} does not exist!")
             return
-        # Remove from old team
-        old_team = record["team"]
-        if player_id in team_stats.get(old_team, {}).get("members", []):
-            team_stats[old_team]["members"].remove(player_id)
-        # Add to new team
-        team_stats[team]["members"].append(player_id)
-        record["team"] = team
 
-    await ctx.send(f"✅ {record['username']} updated successfully!")
-    save_data()
+        def edit():
+            if wins is not None:
+                player.wins = wins
+            if losses is not None:
+                player.losses = losses
+            if team is not None:
+                # Move off the old team (if any) and onto the new one
+                previous = league.membership.add(player_id, team)
+                player.team = team
+                if previous is not None and previous != team:
+                    league.record_change("TEAMS", previous)
+                league.record_change("TEAMS", team)
+            league.refresh_ranking(player_id)
+            league.record_change("players", player_id)
+        unit.stage(edit)
+
+    await ctx.send(f"✅ {player.username} updated successfully!")
 
 
 # ------------- Delete Player Command ------------ #
-@commands.command()
+@commands.hybrid_command()
+@commands.guild_only()
+@app_commands.describe(username="The player to delete")
+@app_commands.autocomplete(username=player_autocomplete)
 async def deleteplayer(ctx, username: str):
     """Delete a player from the system"""
-    matches = find_player_by_name(username)
+    league = ctx.league
+    matches = league.find_player_by_name(username)
     if not matches:
         await ctx.send(f"No player found matching '{username}'.")
         return
     if len(matches) > 1:
-        names = ", ".join(r["username"] for _, r in matches)
+        names = ", ".join(p.username for _, p in matches)
         await ctx.send(f"Multiple players found: {names}. Please be more specific.")
         return
 
-    player_id, record = matches[0]
-    team_name = record["team"]
-    if player_id in team_stats.get(team_name, {}).get("members", []):
-        team_stats[team_name]["members"].remove(player_id)
-    player_stats.pop(player_id, None)
-    training_levels.pop(player_id, None)
+    player_id, player = matches[0]
+    username = player.username
+    old_team = player.team
+    async with league.unit(teams=[old_team], players=[player_id]) as unit:
+        if player_id not in league.player_stats or player.team != old_team:
+            await ctx.send(f"⚠️ {username} was changed by another command. Please try again.")
+            return
 
-    await ctx.send(f"🗑️ Player {record['username']} deleted successfully!")
-    save_data()
+        def delete():
+            team_name = league.membership.remove(player_id)
+            league.player_stats.pop(player_id, None)
+            league.name_index.remove(player_id)
+            league.refresh_ranking(player_id)
+            if team_name in league.team_stats:
+                league.record_change("TEAMS", team_name)
+            league.record_change("players", player_id)
+            league.record_change("training_levels", player_id)
+        unit.stage(delete)
 
+    await ctx.send(f"🗑️ Player {username} deleted successfully!")
 
-# ------------- Team Stats Command --------------- #
+
+# ------------- Record Match Command ------------ #
 @commands.command()
-async def teamstats(ctx, team: str):
-    """Show stats for a specific team"""
-    if team not in team_stats:
-        await ctx.send(f"Team {team} does not exist!")
+@commands.guild_only()
+async def recordmatch(ctx, winner: str, loser: str, *, players: str):
+    """Record one match result and update player and team records"""
+    league = ctx.league
+    if league.ratings_lock.locked():
+        await ctx.send(RATINGS_REBUILDING)
+        return
+    text = f"{winner} {loser} {players}"
+    match, errors = league.build_match(text)
+    if not errors:
+        async with league.unit(teams=match[:2], players=match[2] + match[3]) as unit:
+            # A rebuild may have started while we waited for the locks; nothing awaits
+            # between this check and the commit, so the two can't interleave
+            if league.ratings_lock.locked():
+                await ctx.send(RATINGS_REBUILDING)
+                return
+            # Validate again now the teams and players are locked
+            match, errors = league.build_match(text)
+            if not errors:
+                unit.stage(league.record_result, *match)
+    if errors:
+        await ctx.send(f"⚠️ Match not recorded:\n{_error_list(errors)}")
         return
 
-    embed = discord.Embed(
-        title=f"Displaying Team {team}",
-        color=0x00ffff  # cyan
-    )
+    event = unit.results[0]
+    await ctx.send(f"✅ Match {_match_summary(league, event)} recorded!")
 
-    members = team_stats[team]["members"]  # list of player IDs
-    players_with_rates = []
+# ------------- Record Matches Command ----------- #
+@commands.command()
+@commands.guild_only()
+async def recordmatches(ctx, *, results: str = None):
+    """Record a whole match night, one `<winner> <loser> <players>` per line or from an attached file"""
+    league = ctx.league
+    if league.ratings_lock.locked():
+        await ctx.send(RATINGS_REBUILDING)
+        return
+    text = "\n".join([results or "", await _read_attachments(ctx.message)])
+    lines = [(line_no, line.strip()) for line_no, line in enumerate(text.splitlines(), 1)]
+    lines = [(line_no, line) for line_no, line in lines if line and not line.startswith("#")]
+    if not lines:
+        await ctx.send("📝 List one `<winner> <loser> <players>` per line, or attach a file of them.")
+        return
 
-    for player_id in members:
-        record = player_stats.get(player_id, {"wins": 0, "losses": 0, "username": "Unknown"})
-        wins = record.get("wins", 0)
-        losses = record.get("losses", 0)
-        total_games = wins + losses
-        win_rate = (wins / total_games) * 100 if total_games > 0 else 0.0
+    def validate():
+        valid, errors = [], []
+        for line_no, line in lines:
+            match, match_errors = league.build_match(line)
+            errors += [f"Line {line_no}: {e}" for e in match_errors]
+            if match is not None:
+                valid.append(match)
+        return valid, errors
+
+    # Validate every line before recording anything
+    valid, errors = validate()
+    if not errors:
+        teams = {team for match in valid for team in match[:2]}
+        players = {player_id for match in valid for player_id in match[2] + match[3]}
+        # The whole night is one unit: every team and player involved is locked and it goes out in one write
+        async with league.unit(teams=teams, players=players) as unit:
+            if league.ratings_lock.locked():
+                await ctx.send(RATINGS_REBUILDING)
+                return
+            valid, errors = validate()
+            if not errors:
+                for match in valid:
+                    unit.stage(league.record_result, *match)
+    if errors:
+        await ctx.send(f"⚠️ No matches recorded. Please fix these and send the whole list again:\n{_error_list(errors)}")
+        return
+
+    events = unit.results
+
+    summary = "\n".join(_match_summary(league, event) for event in events)
+    if len(summary) > 1800:
+        summary = summary[:1800] + "\n…(truncated)"
+    await ctx.send(f"✅ Recorded {len(events)} match(es):\n{summary}")
+
+# ------------- Rebuild Ratings Command ---------- #
+@commands.command()
+@commands.guild_only()
+async def rebuildratings(ctx):
+    """Recompute every rating from the full match history (after changing rating settings)"""
+    league = ctx.league
+    if league.ratings_lock.locked():
+        await ctx.send("⏳ Ratings are already being rebuilt.")
+        return
+    async with league.ratings_lock:
+        await ctx.send(f"🔄 Rebuilding ratings from {league.match_log.count} match(es)...")
+        # Reading and replaying the history both happen off the event loop
+        events = await league.service.query(league.service.load_matches)
+        ratings = await asyncio.to_thread(replay, events)
+        for player_id, player in league.player_stats.items():
+            player.rating, player.rd = ratings.get(player_id, (RATING_START, RATING_RD_START))
+            league.record_change("players", player_id)
+        league.rating_board.rebuild(league.player_stats.rating_entries())
+        await league.service.flush()
+    await ctx.send(f"✅ Ratings rebuilt for {len(league.player_stats)} player(s).")
+
+# ------------- Team Stats Command --------------- #
+@commands.hybrid_command()
+@commands.guild_only()
+@app_commands.describe(team="The team to show", page="Page number", sort="winrate or rating")
+@app_commands.autocomplete(team=team_autocomplete, sort=sort_autocomplete)
+async def teamstats(ctx, team: str, page: Optional[int] = 1, sort: str = "winrate"):
+    """Show stats for a specific team, sorted by winrate or rating"""
+    league = ctx.league
+    if team not in league.team_stats:
+        await ctx.send(f"Team {team} does not exist!")
+        return
+    order = SORT_ORDERS.get(sort.lower())
+    if order is None:
+        await ctx.send(f"❌ Sort must be one of: {', '.join(SORT_ORDERS)}")
+        return
 
-        players_with_rates.append((record["username"], win_rate))
+    def count():
+        return len(league.team_stats[team]["members"]) if team in league.team_stats else 0
 
-    # Sort by winrate descending
-    players_with_rates.sort(key=lambda x: x[1], reverse=True)
+    async def render(page_index):
+        return await league.renders.get(("teamstats", team, order, page_index, league.version),
+                                        lambda: render_page(page_index))
 
-    for username, win_rate in players_with_rates:
-        embed.add_field(
-            name=username,
-            value=f"🏆 {win_rate:.1f}%",
-            inline=False
+    async def render_page(page_index):
+        embed = discord.Embed(
+            title=f"Displaying Team {team}",
+            color=0x00ffff  # cyan
         )
+        if team not in league.team_stats:
+            embed.description = "This team has been deleted."
+            return embed
 
-    await ctx.send(embed=embed)
-    save_data()
+        # Sorted by winrate (or rating) descending
+        for _, username, _, _, win_rate, rating, rd in await league.team_ranking(team, page_index * PAGE_SIZE, PAGE_SIZE, order):
+            embed.add_field(
+                name=username,
+                value=f"🏆 {win_rate:.1f}% | 📈 {rating:.0f} ±{rd:.0f}",
+                inline=False
+            )
+        embed.set_footer(text=f"Page {page_index + 1}/{page_count(count())}")
+        return embed
+
+    # Page turns keep reading this league, so it stays loaded while the buttons work
+    await send_paginated(ctx, render, count, page - 1, on_close=leagues.pin(league))
 
 
 # ------------- Player Stats Command ------------- #
-@commands.command()
+@commands.hybrid_command()
+@commands.guild_only()
+@app_commands.describe(username="The player to show")
+@app_commands.autocomplete(username=player_autocomplete)
 async def playerstats(ctx, username: str):
     """Show stats for a specific player"""
-    matches = find_player_by_name(username)
+    league = ctx.league
+    matches = league.find_player_by_name(username)
     if not matches:
         await ctx.send(f"No player found matching '{username}'.")
         return
     if len(matches) > 1:
-        names = ", ".join(r["username"] for _, r in matches)
+        names = ", ".join(p.username for _, p in matches)
         await ctx.send(f"Multiple players found: {names}. Please be more specific.")
         return
 
-    player_id, record = matches[0]
-    wins = record["wins"]
-    losses = record["losses"]
-    level_index = training_levels.get(player_id, 0)
-    level_name = TRAINING_ROLES[level_index]
-    win_rate = (wins / (wins + losses) * 100) if (wins + losses) > 0 else 0
-
-    embed = discord.Embed(
-        title=f"📊 Stats for {record['username']}",
-        color=0x3498db  # blue
-    )
-    embed.add_field(name="Team", value=record["team"], inline=True)
-    embed.add_field(name="Level", value=level_name, inline=True)
-    embed.add_field(name="Record", value=f"{wins}-{losses}", inline=True)
-    embed.add_field(name="Win Rate", value=f"{win_rate:.1f}%", inline=True)
+    player_id, player = matches[0]
 
-    await ctx.send(embed=embed)
+    async def render():
+        embed = discord.Embed(
+            title=f"📊 Stats for {player.username}",
+            color=0x3498db  # blue
+        )
+        embed.add_field(name="Team", value=player.team, inline=True)
+        embed.add_field(name="Level", value=player.training_role, inline=True)
+        embed.add_field(name="Record", value=f"{player.wins}-{player.losses}", inline=True)
+        embed.add_field(name="Win Rate", value=f"{player.win_percent():.1f}%", inline=True)
+        embed.add_field(name="Rating", value=f"{player.rating:.0f} ±{player.rd:.0f}", inline=True)
+        rank = league.leaderboard.rank(player_id)
+        if rank is not None:
+            embed.add_field(name="Rank", value=f"#{rank} of {len(league.leaderboard)}", inline=True)
+        rank = league.rating_board.rank(player_id)
+        if rank is not None:
+            embed.add_field(name="Rating Rank", value=f"#{rank} of {len(league.rating_board)}", inline=True)
+        return embed
+
+    # Unchanged data is served from the league's render cache
+    await ctx.send(embed=await league.renders.get(("playerstats", player_id, league.version), render))
 
 # ------------- Players Command --------------------- #
 @commands.command(name="players")
-async def players(ctx):
-    """List all players sorted by winrate"""
-    if not player_stats:
+@commands.guild_only()
+async def players(ctx, page: Optional[int] = 1, sort: str = "winrate"):
+    """List all players sorted by winrate or rating"""
+    league = ctx.league
+    if not league.player_stats:
         await ctx.send("No players found!")
         return
+    order = SORT_ORDERS.get(sort.lower())
+    if order is None:
+        await ctx.send(f"❌ Sort must be one of: {', '.join(SORT_ORDERS)}")
+        return
 
-    embed = discord.Embed(
-        title="🏅 Player Rankings by Winrate",
-        color=0xffd700  # gold
-    )
+    def count():
+        return len(league.player_stats)
 
-    players_with_rates = []
-    for player_id, record in player_stats.items():
-        wins = record.get("wins", 0)
-        losses = record.get("losses", 0)
-        total_games = wins + losses
-        win_rate = (wins / total_games) * 100 if total_games > 0 else 0.0
-        players_with_rates.append((record["username"], win_rate, wins, losses))
-    players_with_rates.sort(key=lambda x: x[1], reverse=True)
-    for username, win_rate, wins, losses in players_with_rates:
-        embed.add_field(
-            name=username,
-            value=f"Record: {wins}-{losses} | 🏆 {win_rate:.1f}%",
-            inline=False
+    async def render(page_index):
+        return await league.renders.get(("players", order, page_index, league.version),
+                                        lambda: render_page(page_index))
+
+    async def render_page(page_index):
+        embed = discord.Embed(
+            title="🏅 Player Rankings by Rating" if order == "rating" else "🏅 Player Rankings by Winrate",
+            color=0xffd700  # gold
         )
+        start = page_index * PAGE_SIZE
+        for rank, (_, username, wins, losses, win_rate, rating, rd) in enumerate(
+                await league.ranked_players(start, PAGE_SIZE, order), start + 1):
+            embed.add_field(
+                name=f"#{rank} {username}",
+                value=f"Record: {wins}-{losses} | 🏆 {win_rate:.1f}% | 📈 {rating:.0f} ±{rd:.0f}",
+                inline=False
+            )
+        embed.set_footer(text=f"Page {page_index + 1}/{page_count(count())}")
+        return embed
 
-    await ctx.send(embed=embed)
-    save_data()
+    # Page turns keep reading this league, so it stays loaded while the buttons work
+    await send_paginated(ctx, render, count, page - 1, on_close=leagues.pin(league))
 
 
 # ------------- Teams Command --------------------- #
 @commands.command(name="teams")
-async def teams(ctx):
+@commands.guild_only()
+async def teams(ctx, page: int = 1):
     """List all teams with their records and member counts"""
-    if not team_stats:
+    league = ctx.league
+    if not league.team_stats:
         await ctx.send("No teams have been created yet!")
         return
 
-    embed = discord.Embed(
-        title="📋 Teams (Most Recent First)",
-        color=0x1abc9c  # teal
-    )
-    team_list = list(team_stats.items())[::-1]
-
-    for team_name, data in team_list:
-        wins = data.get("wins", 0)
-        losses = data.get("losses", 0)
-        embed.add_field(
-            name=team_name,
-            value=f"Record: {wins}-{losses}, Members: {len(data['members'])}",
-            inline=False
-        )
+    def count():
+        return len(league.team_stats)
 
-    await ctx.send(embed=embed)
-    save_data()
+    async def render(page_index):
+        return await league.renders.get(("teams", page_index, league.version), lambda: render_page(page_index))
+
+    async def render_page(page_index):
+        embed = discord.Embed(
+            title="📋 Teams (Most Recent First)",
+            color=0x1abc9c  # teal
+        )
+        start = page_index * PAGE_SIZE
+        team_list = islice(reversed(league.team_stats.items()), start, start + PAGE_SIZE)
+        # Per-team player totals in one pass over the player columns
+        aggregates = league.player_stats.team_aggregates()
+
+        for team_name, data in team_list:
+            wins = data.get("wins", 0)
+            losses = data.get("losses", 0)
+            value = f"Record: {wins}-{losses}, Members: {len(data['members'])}"
+            if team_name in aggregates:
+                value += f", Avg WR: {aggregates[team_name][3]:.1f}%"
+            embed.add_field(
+                name=team_name,
+                value=value,
+                inline=False
+            )
+        embed.set_footer(text=f"Page {page_index + 1}/{page_count(count())}")
+        return embed
+
+    # Page turns keep reading this league, so it stays loaded while the buttons work
+    await send_paginated(ctx, render, count, page - 1, on_close=leagues.pin(league))
 
 # -------------- Rosters Command -------------------- #
-# -------------- Rosters Command -------------------- #
-@commands.command(name="rosters")
-async def rosters(ctx, team_name: str):
-    """Generate balanced rosters for 2v2 and 3v3 games"""
-    
-    if team_name not in team_stats:
-        await ctx.send(f"❌ Team {team_name} does not exist!")
-        return
-    
-    team_data = team_stats[team_name]
-    member_ids = team_data["members"]
-    
-    if not member_ids:
-        await ctx.send(f"❌ Team {team_name} has no players!")
-        return
-    
-    await ctx.send(f"🎮 **Starting roster creation for {team_name}**\n"
-                   f"Season has **12 total games**: 8 x 2v2 and 4 x 3v3\n"
-                   f"We need to fill one side of each game.\n\n"
-                   f"Please respond with each player's info when prompted.\n")
-    
+def _availability_entry(player, max_games, away):
+    return {
+        "username": player.username,
+        "max_games": max_games,
+        "win_rate": player.win_percent(),
+        "skill": player.skill,
+        "games_assigned": 0,
+        "away": away
+    }
+
+async def _read_attachments(msg):
+    """Text of any attached CSV/text files"""
+    parts = []
+    for attachment in msg.attachments:
+        data = await attachment.read()
+        parts.append(data.decode("utf-8-sig", errors="replace"))
+    return "\n".join(parts)
+
+async def _bulk_availability(ctx, team_name, member_ids, text):
+    """Parse and resolve one availability block; players not on the team count as away"""
+    league = ctx.league
+    entries, errors = parse_availability(text)
+    resolved, resolve_errors = resolve_availability(entries, league.find_player_by_name)
+    errors += resolve_errors
+    if errors:
+        await ctx.send(f"⚠️ Please fix these and send the whole list again:\n{_error_list(errors)}")
+        return None
+    if not resolved:
+        await ctx.send("⚠️ No players listed.")
+        return None
+    return {
+        player_id: _availability_entry(player, games, player_id not in member_ids)
+        for player_id, (player, games) in resolved.items()
+    }
+
+async def _prompt_availability(ctx, team_name, member_ids):
+    """Ask for each player's max games one message at a time"""
+    league = ctx.league
     # Step 1: Collect player availability
     player_availability = {}
     
     for player_id in member_ids:
-        record = player_stats.get(player_id)
-        if not record:
+        player = league.player_stats.get(player_id)
+        if not player:
             continue
             
-        username = record["username"]
+        username = player.username
         
         # Ask for max games
         await ctx.send(f"📝 **{username}**: How many games maximum? (0-12)")
@@ -401,14 +721,7 @@ async def rosters(ctx, team_name: str):
                 await ctx.send(f"⚠️ Invalid number. Setting {username} to 0 games.")
                 max_games = 0
             
-            player_availability[player_id] = {
-                "username": username,
-                "max_games": max_games,
-                "wins": record.get("wins", 0),
-                "losses": record.get("losses", 0),
-                "games_assigned": 0,
-                "away": False
-            }
+            player_availability[player_id] = _availability_entry(player, max_games, False)
             
         except asyncio.TimeoutError:
             await ctx.send(f"⏰ No response for {username}. Skipping them.")
@@ -429,11 +742,11 @@ async def rosters(ctx, team_name: str):
             away_names = [name.strip() for name in away_input.split(',')]
             
             for name in away_names:
-                matches = find_player_by_name(name)
+                matches = league.find_player_by_name(name)
                 if matches and len(matches) == 1:
-                    player_id, record = matches[0]
+                    player_id, player = matches[0]
                     
-                    await ctx.send(f"📝 **{record['username']}** (Away Player): How many games for {team_name}? (0-12)")
+                    await ctx.send(f"📝 **{player.username}** (Away Player): How many games for {team_name}? (0-12)")
                     
                     try:
                         msg = await ctx.bot.wait_for('message', timeout=30.0, 
@@ -443,200 +756,156 @@ async def rosters(ctx, team_name: str):
                         if max_games < 0 or max_games > 12:
                             max_games = 0
                         
-                        player_availability[player_id] = {
-                            "username": record["username"],
-                            "max_games": max_games,
-                            "wins": record.get("wins", 0),
-                            "losses": record.get("losses", 0),
-                            "games_assigned": 0,
-                            "away": True
-                        }
+                        player_availability[player_id] = _availability_entry(player, max_games, True)
                         
                     except asyncio.TimeoutError:
-                        await ctx.send(f"⏰ Skipping {record['username']}")
+                        await ctx.send(f"⏰ Skipping {player.username}")
                 else:
                     await ctx.send(f"⚠️ Could not find unique player matching '{name}'")
                         
     except asyncio.TimeoutError:
         await ctx.send("⏰ No away games added.")
     
-    # Step 3: Rank players by skill (win rate %)
+    return player_availability
+
+@commands.hybrid_command(name="rosters")
+@commands.guild_only()
+@app_commands.describe(team_name="The team to build rosters for",
+                       availability="Optional winrate/rating, then `name: games` entries separated by ;")
+@app_commands.autocomplete(team_name=team_autocomplete)
+async def rosters(ctx, team_name: str, *, availability: str = None):
+    """Generate balanced rosters for 2v2 and 3v3 games, seeded by winrate (default) or rating"""
+    league = ctx.league
+    
+    if team_name not in league.team_stats:
+        await ctx.send(f"❌ Team {team_name} does not exist!")
+        return
+    
+    # An optional leading `winrate` / `rating` picks what lineups are balanced on
+    order = "win_rate"
+    if availability:
+        first, *rest = availability.split(None, 1)
+        if first.lower() in SORT_ORDERS:
+            order = SORT_ORDERS[first.lower()]
+            availability = rest[0] if rest else None
+    
+    # Snapshot the roster: the prompts below can take minutes and other commands keep running
+    team_data = league.team_stats[team_name]
+    member_ids = dict(team_data["members"])
+    
+    if not member_ids:
+        await ctx.send(f"❌ Team {team_name} has no players!")
+        return
+    
+    # Availability can come with the command itself (text after the team name or an attachment)
+    if availability or ctx.message.attachments:
+        text = "\n".join([availability or "", await _read_attachments(ctx.message)])
+        player_availability = await _bulk_availability(ctx, team_name, member_ids, text)
+        if player_availability is None:
+            return
+    else:
+        roster_names = ", ".join(league.player_stats[p].username for p in member_ids if p in league.player_stats)
+        if len(roster_names) > 1000:
+            roster_names = roster_names[:1000] + "…"
+        await ctx.send(f"🎮 **Starting roster creation for {team_name}**\n"
+                       f"Season has **12 total games**: 8 x 2v2 and 4 x 3v3\n"
+                       f"We need to fill one side of each game.\n\n"
+                       f"Send everyone's max games (0-12) in **one message**, one `name: games` per line, "
+                       f"or attach a CSV. Players from other teams count as away players; "
+                       f"team members you leave out get 0 games.\n"
+                       f"Team: {roster_names}\n"
+                       f"Or type `ask` to be prompted one player at a time.")
+        
+        def intake_check(m):
+            return m.author == ctx.author and m.channel == ctx.channel
+        
+        player_availability = None
+        while player_availability is None:
+            try:
+                msg = await ctx.bot.wait_for('message', timeout=180.0, check=intake_check)
+            except asyncio.TimeoutError:
+                await ctx.send("⏰ No availability received. Roster creation cancelled.")
+                return
+            if msg.content.strip().lower() == "ask" and not msg.attachments:
+                player_availability = await _prompt_availability(ctx, team_name, member_ids)
+            else:
+                text = "\n".join([msg.content, await _read_attachments(msg)])
+                player_availability = await _bulk_availability(ctx, team_name, member_ids, text)
+    
+    # Step 3: Collect everyone with games to give, with their skill (win rate % or rating)
     available_players = []
     for player_id, data in player_availability.items():
         if data["max_games"] > 0:
-            total_games = data["wins"] + data["losses"]
-            win_rate = (data["wins"] / total_games * 100) if total_games > 0 else 0
             available_players.append({
                 "id": player_id,
-                "username": data["username"],
-                "win_rate": win_rate,
+                "skill": data["skill"] if order == "rating" else data["win_rate"],
                 "max_games": data["max_games"],
-                "games_assigned": 0,
                 "away": data["away"]
             })
     
-    # Sort by win rate descending (best players first)
-    available_players.sort(key=lambda x: x["win_rate"], reverse=True)
-    
     if len(available_players) < 2:
         await ctx.send(f"❌ Not enough players available! Need at least 2 players.")
         return
     
-    await ctx.send("⚙️ Generating balanced rosters...")
-    
-    # Step 4: Helper function to get next available player
-    def get_available_player(exclude_ids=None):
-        """Get next player with games remaining, excluding specific IDs"""
-        if exclude_ids is None:
-            exclude_ids = set()
-        
-        for player in available_players:
-            if player["id"] not in exclude_ids and player["games_assigned"] < player["max_games"]:
-                return player
-        return None
-    
-    # Step 5: Generate 3v3 rosters FIRST (4 games, higher priority)
-    rosters_3v3 = []
-    
-    for game_num in range(4):
-        team = []
-        used_ids = set()
-        
-        # Try to balance: 1 strong + 1 medium + 1 weak
-        # Pick from top third (strong)
-        strong_player = None
-        for player in available_players[:len(available_players)//3 + 1]:
-            if player["id"] not in used_ids and player["games_assigned"] < player["max_games"]:
-                strong_player = player
-                break
-        
-        if strong_player:
-            team.append((strong_player["id"], strong_player["username"]))
-            strong_player["games_assigned"] += 1
-            used_ids.add(strong_player["id"])
-        
-        # Pick from middle third (medium)
-        medium_player = None
-        mid_start = len(available_players) // 3
-        mid_end = 2 * len(available_players) // 3
-        for player in available_players[mid_start:mid_end + 1]:
-            if player["id"] not in used_ids and player["games_assigned"] < player["max_games"]:
-                medium_player = player
-                break
-        
-        if medium_player:
-            team.append((medium_player["id"], medium_player["username"]))
-            medium_player["games_assigned"] += 1
-            used_ids.add(medium_player["id"])
-        
-        # Pick from bottom third (weak)
-        weak_player = None
-        for player in reversed(available_players):
-            if player["id"] not in used_ids and player["games_assigned"] < player["max_games"]:
-                weak_player = player
-                break
-        
-        if weak_player:
-            team.append((weak_player["id"], weak_player["username"]))
-            weak_player["games_assigned"] += 1
-            used_ids.add(weak_player["id"])
-        
-        # If we couldn't get balanced team, fill with anyone available
-        while len(team) < 3:
-            next_player = get_available_player(used_ids)
-            if next_player:
-                team.append((next_player["id"], next_player["username"]))
-                next_player["games_assigned"] += 1
-                used_ids.add(next_player["id"])
-            else:
-                break
-        
-        if len(team) == 3:
-            rosters_3v3.append(team)
-        else:
-            break  # Can't fill more 3v3 games
+    await ctx.send("⚙️ Generating balanced rosters... (type `cancel` to stop)")
     
-    # Step 6: Generate 2v2 rosters (8 games)
-    rosters_2v2 = []
+    # Step 4: Fill the 3v3 games first, then 2v2, keeping lineups evenly matched.
+    # The solver runs in a worker process; the invoking user can abort it.
+    solve = asyncio.ensure_future(solve_in_pool(ctx.guild.id, available_players))
+    abort = asyncio.ensure_future(ctx.bot.wait_for(
+        'message',
+        check=lambda m: m.author == ctx.author and m.channel == ctx.channel and m.content.strip().lower() == "cancel"
+    ))
+    await asyncio.wait({solve, abort}, return_when=asyncio.FIRST_COMPLETED)
+    abort.cancel()
+    if not solve.done():
+        solve.cancel()
+        await ctx.send("🛑 Roster generation cancelled.")
+        return
     
-    for game_num in range(8):
-        team = []
-        used_ids = set()
-        
-        # Try to balance: 1 strong + 1 weak
-        # Pick strong player from top half
-        strong_player = None
-        for player in available_players[:len(available_players)//2 + 1]:
-            if player["id"] not in used_ids and player["games_assigned"] < player["max_games"]:
-                strong_player = player
-                break
-        
-        if strong_player:
-            team.append((strong_player["id"], strong_player["username"]))
-            strong_player["games_assigned"] += 1
-            used_ids.add(strong_player["id"])
-        
-        # Pick weak player from bottom half
-        weak_player = None
-        for player in reversed(available_players):
-            if player["id"] not in used_ids and player["games_assigned"] < player["max_games"]:
-                weak_player = player
-                break
-        
-        if weak_player:
-            team.append((weak_player["id"], weak_player["username"]))
-            weak_player["games_assigned"] += 1
-            used_ids.add(weak_player["id"])
-        
-        # If we couldn't get balanced team, fill with anyone available
-        while len(team) < 2:
-            next_player = get_available_player(used_ids)
-            if next_player:
-                team.append((next_player["id"], next_player["username"]))
-                next_player["games_assigned"] += 1
-                used_ids.add(next_player["id"])
-            else:
-                break
-        
-        if len(team) == 2:
-            rosters_2v2.append(team)
-        else:
-            break  # Can't fill more 2v2 games
+    try:
+        result = solve.result()
+    except RosterBusy:
+        await ctx.send("⏳ Another roster is already being generated in this server. Please try again shortly.")
+        return
+    except asyncio.TimeoutError:
+        await ctx.send("⏰ Roster generation took too long. Please try again with fewer players.")
+        return
+    rosters_3v3 = result["3v3"]
+    rosters_2v2 = result["2v2"]
     
-    # Step 7: Display results
+    # Step 5: Display results
     embed = discord.Embed(
         title=f"🎯 Season Rosters for {team_name}",
         description=f"Total: {len(rosters_2v2) + len(rosters_3v3)} out of 12 games filled",
         color=0x00ff00
     )
     
+    def lineup_text(lineups):
+        text = ""
+        for i, team in enumerate(lineups, 1):
+            players = " + ".join([player_availability[player_id]["username"] for player_id in team])
+            text += f"**Game {i}:** {players}\n"
+        return text
+    
     # 3v3 Section
     if rosters_3v3:
-        games_3v3_text = ""
-        for i, team in enumerate(rosters_3v3, 1):
-            players = " + ".join([username for _, username in team])
-            games_3v3_text += f"**Game {i}:** {players}\n"
-        
-        embed.add_field(name="⚔️ 3v3 Games (4 total)", value=games_3v3_text, inline=False)
+        embed.add_field(name="⚔️ 3v3 Games (4 total)", value=lineup_text(rosters_3v3), inline=False)
     else:
         embed.add_field(name="⚔️ 3v3 Games", value="❌ Could not fill any 3v3 games", inline=False)
     
     # 2v2 Section
     if rosters_2v2:
-        games_2v2_text = ""
-        for i, team in enumerate(rosters_2v2, 1):
-            players = " + ".join([username for _, username in team])
-            games_2v2_text += f"**Game {i}:** {players}\n"
-        
-        embed.add_field(name="🎮 2v2 Games (8 total)", value=games_2v2_text, inline=False)
+        embed.add_field(name="🎮 2v2 Games (8 total)", value=lineup_text(rosters_2v2), inline=False)
     else:
         embed.add_field(name="🎮 2v2 Games", value="❌ Could not fill any 2v2 games", inline=False)
     
     # Player Usage Summary
     usage_text = ""
-    for player in sorted(available_players, key=lambda x: x["games_assigned"], reverse=True):
-        away_marker = " (Away)" if player["away"] else ""
-        usage_text += f"{player['username']}{away_marker}: {player['games_assigned']}/{player['max_games']} games\n"
+    for player in sorted(available_players, key=lambda x: result["assigned"][x["id"]], reverse=True):
+        data = player_availability[player["id"]]
+        away_marker = " (Away)" if data["away"] else ""
+        usage_text += f"{data['username']}{away_marker}: {result['assigned'][player['id']]}/{player['max_games']} games\n"
     
     if len(usage_text) > 1024:  # Discord field limit
         usage_text = usage_text[:1000] + "...\n(List truncated)"
@@ -646,48 +915,105 @@ async def rosters(ctx, team_name: str):
     # Summary
     total_filled = len(rosters_2v2) + len(rosters_3v3)
     summary = f"✅ {len(rosters_3v3)}/4 3v3 games • {len(rosters_2v2)}/8 2v2 games • {total_filled}/12 total"
+    if order == "rating":
+        summary += " • balanced by rating"
+    if result["method"] != "optimal":
+        summary += f" • {result['method']} solve"
     embed.set_footer(text=summary)
     
     await ctx.send(embed=embed)
 
 # ------------- Export Command --------------------- #
 @commands.command()
-async def exportrosters(ctx, team_name: str):
-    """Export team rosters to a text file"""
-    if team_name not in team_stats:
-        await ctx.send(f"❌ Team {team_name} does not exist!")
+@commands.guild_only()
+async def exportrosters(ctx, team_name: str, fmt: str = "txt"):
+    """Export one team's roster, or every team's with 'all', as txt/csv/json"""
+    league = ctx.league
+    fmt = fmt.lower()
+    if fmt not in EXPORT_FORMATS:
+        await ctx.send(f"❌ Format must be one of: {', '.join(EXPORT_FORMATS)}")
         return
     
-    members = team_stats[team_name]["members"]
-    
-    # Create text file content
-    content = f"=== {team_name} Roster ===\n\n"
-    
-    for level in TRAINING_ROLES:
-        players_at_level = []
-        for player_id in members:
-            record = player_stats.get(player_id)
-            if record and training_levels.get(player_id, 0) == TRAINING_ROLES.index(level):
-                wins = record.get("wins", 0)
-                losses = record.get("losses", 0)
-                win_rate = (wins / (wins + losses) * 100) if (wins + losses) > 0 else 0
-                players_at_level.append(f"  - {record['username']} ({wins}-{losses}, {win_rate:.1f}%)")
-        
-        if players_at_level:
-            content += f"{level}s:\n"
-            content += "\n".join(players_at_level)
-            content += "\n\n"
-    
-    # Create file
-    filename = f"{team_name}_roster.txt"
-    with open(filename, "w") as f:
-        f.write(content)
+    export_all = team_name.lower() == "all" and team_name not in league.team_stats
+    if export_all:
+        if not league.team_stats:
+            await ctx.send("No teams have been created yet!")
+            return
+        team_names = list(league.team_stats)
+        basename = "league_rosters"
+    elif team_name not in league.team_stats:
+        await ctx.send(f"❌ Team {team_name} does not exist!")
+        return
+    else:
+        team_names = [team_name]
+        basename = f"{team_name}_roster"
     
-    # Send file
-    await ctx.send(f"📄 Roster exported!", file=discord.File(filename))
+    # Rows are snapshots, so the file can be built off the event loop
+    teams = [(name, await league.team_roster_by_level(name)) for name in team_names]
+    fp, filename = await asyncio.to_thread(build_export, teams, fmt, TRAINING_ROLES, basename)
     
-    # Clean up
-    os.remove(filename)
+    # Send file straight from memory
+    await ctx.send(f"📄 Roster exported!", file=discord.File(fp, filename=filename))
+
+
+# -------------- Perf Command -------------------- #
+@commands.command(name="perf")
+@commands.has_permissions(administrator=True)
+async def perf(ctx):
+    """Show per-command latency, event-loop lag and persistence timings (admins only)"""
+    embed = discord.Embed(
+        title="⏱️ Performance",
+        description=f"Last {metrics.ring_size} samples per series, in ms",
+        color=0xe67e22
+    )
+
+    def ms(seconds):
+        return f"{seconds * 1000:.1f}"
+
+    rows = []
+    for name, phases in sorted(metrics.commands.items(), key=lambda item: -item[1]["total"].count):
+        p50, _, p99 = phases["total"].quantiles()
+        compute, io, api = (phases[phase].quantiles((0.5,))[0] for phase in ("compute", "io", "discord"))
+        rows.append(f"{name[:14]:<14} {phases['total'].count:>6} {ms(p50):>7} {ms(p99):>7} "
+                    f"{ms(compute):>6} {ms(io):>6} {ms(api):>6}")
+    if rows:
+        header = f"{'command':<14} {'n':>6} {'p50':>7} {'p99':>7} {'cpu':>6} {'io':>6} {'api':>6}"
+        table = "\n".join([header] + rows)
+        if len(table) > 1000:
+            table = table[:1000] + "\n…"
+        embed.add_field(name="🧮 Commands (cpu/io/api are p50s)", value=f"```\n{table}\n```", inline=False)
+
+    timers = [f"{name[:20]:<20} {ring.count:>6} {ms(ring.quantiles()[0]):>7} {ms(ring.quantiles()[2]):>7}"
+              for name, ring in sorted(metrics.timers.items())]
+    if timers:
+        header = f"{'timer':<20} {'n':>6} {'p50':>7} {'p99':>7}"
+        embed.add_field(name="💾 Persistence, Discord & loop", value="```\n" + "\n".join([header] + timers) + "\n```",
+                        inline=False)
+    if metrics.counters:
+        embed.add_field(name="🗃️ Counters",
+                        value="\n".join(f"{name}: {value}" for name, value in sorted(metrics.counters.items())),
+                        inline=False)
+    if not rows and not timers:
+        embed.description = "No samples yet."
+
+    await ctx.send(embed=embed)
+
+
+# -------------- Reload Channels Command -------------------- #
+@commands.command(name="reloadchannels")
+@commands.has_permissions(administrator=True)
+async def reloadchannels(ctx):
+    """Re-read ALLOWED_CHANNEL_IDS / GUILD_CHANNEL_IDS from .env without restarting (admins only)"""
+    try:
+        default, guilds = channel_policy.reload()
+    except ValueError as e:
+        await ctx.send(f"❌ Channel settings not reloaded, the old ones stay in effect: {e}")
+        return
+    if not default and not guilds:
+        await ctx.send("🔓 Channel restrictions reloaded: commands work in every channel.")
+        return
+    await ctx.send(f"🔒 Channel restrictions reloaded: {default} channel(s) everywhere, "
+                   f"{guilds} guild(s) with their own list.")
 
 
 # -------------- Leaders Help Command -------------------- #
@@ -707,8 +1033,8 @@ async def leadersHelp(ctx):
             "`%deleteteam <name>` - Delete a team\n"
             "`%teams` - List all teams\n"
             "`%roster <team>` - View team roster by level\n"
-            "`%teamstats <team>` - View team stats\n"
-            "`%exportrosters <team>` - Export roster to file"
+            "`%teamstats <team> [page] [winrate|rating]` - View team stats\n"
+            "`%exportrosters <team|all> [txt|csv|json]` - Export rosters to file"
         ),
         inline=False
     )
@@ -717,9 +1043,10 @@ async def leadersHelp(ctx):
         name="👥 Player Commands",
         value=(
             "`%addplayer <user> [level] [team]` - Add one player\n"
+            "`%importplayers` + CSV/JSON file - Add many players\n"
             "`%editplayer <user> [wins] [losses] [team]` - Edit player\n"
             "`%deleteplayer <user>` - Remove player\n"
-            "`%players` - List all players\n"
+            "`%players [page] [winrate|rating]` - List all players\n"
             "`%playerstats <user>` - View player stats"
         ),
         inline=False
@@ -728,8 +1055,29 @@ async def leadersHelp(ctx):
     embed.add_field(
         name="🎮 Game Commands",
         value=(
-            "`%rosters <team>` - Generate season rosters\n"
-            "`%recordmatch <winner> <loser> <players>` - Record match result"
+            "`%rosters <team> [winrate|rating]` - Generate season rosters\n"
+            "`%recordmatch <winner> <loser> <players>` - Record match result "
+            "(players split as `winners | losers`, or by team)\n"
+            "`%recordmatches` + one result per line or a file - Record a match night\n"
+            "`%rebuildratings` - Recompute ratings from match history"
+        ),
+        inline=False
+    )
+
+    embed.add_field(
+        name="🛠️ Admin Commands",
+        value=(
+            "`%perf` - Command latency, event-loop lag and persistence timings\n"
+            "`%reloadchannels` - Re-read the allowed channels from .env"
+        ),
+        inline=False
+    )
+    
+    embed.add_field(
+        name="⚡ Slash Commands",
+        value=(
+            "`/playerstats`, `/editplayer`, `/deleteplayer`, `/teamstats` and `/rosters` "
+            "work as slash commands too, with player and team names suggested as you type"
         ),
         inline=False
     )
@@ -740,9 +1088,12 @@ async def leadersHelp(ctx):
 
 # -------------- Setup Commands -------------------- #
 async def setup(bot):
+    # Read the busiest shards while the bot logs in
+    leagues.start_preload()
     bot.add_command(ping) 
     bot.add_command(addteam)
     bot.add_command(addplayer)
+    bot.add_command(importplayers)
     bot.add_command(teamstats)
     bot.add_command(playerstats)
     bot.add_command(teams)
@@ -750,6 +1101,20 @@ async def setup(bot):
     bot.add_command(editplayer)
     bot.add_command(deleteplayer)
     bot.add_command(deleteteam)
+    bot.add_command(recordmatch)
+    bot.add_command(recordmatches)
+    bot.add_command(rebuildratings)
     bot.add_command(rosters)
     bot.add_command(exportrosters)
-    bot.add_command(leadersHelp)
\ No newline at end of file
+    bot.add_command(perf)
+    bot.add_command(reloadchannels)
+    bot.add_command(leadersHelp)
+    bot.add_listener(on_guild_available)
+    bot.add_listener(on_guild_join)
+    bot.add_listener(on_guild_remove)
+    bot.add_listener(on_member_join)
+    bot.add_listener(on_member_remove)
+    bot.add_listener(on_user_update)
+    bot.add_listener(on_guild_role_create)
+    bot.add_listener(on_guild_role_update)
+    bot.add_listener(on_guild_role_delete)
\ No newline at end of file
@@ -0,0 +1,89 @@
+import csv
+import gzip
+import io
+import json
+import os
+from itertools import groupby
+
+
+EXPORT_FORMATS = ("txt", "csv", "json")
+# Exports bigger than this are gzipped so league dumps stay under Discord's upload limit
+EXPORT_COMPRESS_BYTES = int(os.getenv("EXPORT_COMPRESS_BYTES", str(4 * 1024 * 1024)))
+
+
+# Each team is (team name, rows) where rows are the
+# (level index, username, wins, losses, win_rate) tuples from
+# team_roster_by_level, already ordered by level.
+
+def _text_chunks(teams, levels):
+    for team_name, rows in teams:
+        yield f"=== {team_name} Roster ===\n\n"
+        for level_index, group in groupby(rows, key=lambda row: row[0]):
+            yield f"{levels[level_index]}s:\n"
+            yield "\n".join(
+                f"  - {username} ({wins}-{losses}, {win_rate:.1f}%)"
+                for _, username, wins, losses, win_rate in group
+            )
+            yield "\n\n"
+
+def _csv_chunks(teams, levels):
+    line = io.StringIO()
+    writer = csv.writer(line)
+
+    def emit(row):
+        line.seek(0)
+        line.truncate()
+        writer.writerow(row)
+        return line.getvalue()
+
+    yield emit(["team", "level", "username", "wins", "losses", "win_rate"])
+    for team_name, rows in teams:
+        for level_index, username, wins, losses, win_rate in rows:
+            yield emit([team_name, levels[level_index], username, wins, losses, f"{win_rate:.1f}"])
+
+def _json_chunks(teams, levels):
+    yield "["
+    first = True
+    for team_name, rows in teams:
+        for level_index, username, wins, losses, win_rate in rows:
+            record = {
+                "team": team_name,
+                "level": levels[level_index],
+                "username": username,
+                "wins": wins,
+                "losses": losses,
+                "win_rate": round(win_rate, 1)
+            }
+            yield ("" if first else ",\n") + json.dumps(record)
+            first = False
+    yield "]\n"
+
+_WRITERS = {"txt": _text_chunks, "csv": _csv_chunks, "json": _json_chunks}
+
+
+def build_export(teams, fmt: str, levels, basename: str):
+    """Stream an export into memory; returns (file object, filename).
+
+    teams may be any iterable of (team name, rows), so rows are encoded as
+    they are produced rather than joined into one big string. The result is
+    gzipped when it is larger than EXPORT_COMPRESS_BYTES.
+    """
+    buf = io.BytesIO()
+    for chunk in _WRITERS[fmt](teams, levels):
+        buf.write(chunk.encode("utf-8"))
+    filename = f"{basename}.{fmt}"
+
+    if buf.tell() > EXPORT_COMPRESS_BYTES:
+        buf.seek(0)
+        packed = io.BytesIO()
+        with gzip.GzipFile(filename=filename, mode="wb", fileobj=packed) as gz:
+            while True:
+                block = buf.read(64 * 1024)
+                if not block:
+                    break
+                gz.write(block)
+        buf = packed
+        filename += ".gz"
+
+    buf.seek(0)
+    return buf, filename
@@ -0,0 +1,218 @@
+import bisect
+
+
+# ---------------- Name Index ---------------- #
+class NameIndex:
+    """Case-insensitive substring lookup over player usernames (or team names).
+
+    Every lowercased username is split into trigrams; a query only has to
+    check the names that share all of its trigrams instead of every name.
+    Results come back in insertion order, exactly like a scan over
+    player_stats would return them. A sorted (name, id) array answers
+    prefix queries with bisect, for autocomplete.
+    """
+
+    N = 3
+
+    def __init__(self):
+        self._names = {}       # id -> lowercased username
+        self._order = {}       # id -> insertion sequence, for stable result order
+        self._seq = 0
+        self._grams = {}       # trigram -> set of ids
+        self._exact = {}       # lowercased username -> set of ids
+        self._sorted = []      # sorted (lowercased username, id) for prefix lookups
+
+    def __len__(self):
+        return len(self._names)
+
+    def _ngrams(self, text: str):
+        return {text[i:i + self.N] for i in range(len(text) - self.N + 1)}
+
+    def add(self, key: str, username: str):
+        """Index a player, replacing any previous name (this is also how renames work)"""
+        name = username.lower()
+        if key in self._names:
+            if self._names[key] == name:
+                return
+            self._unindex(key)
+        else:
+            self._order[key] = self._seq
+            self._seq += 1
+        self._names[key] = name
+        for gram in self._ngrams(name):
+            self._grams.setdefault(gram, set()).add(key)
+        self._exact.setdefault(name, set()).add(key)
+        bisect.insort(self._sorted, (name, key))
+
+    def remove(self, key: str):
+        if key not in self._names:
+            return
+        self._unindex(key)
+        del self._names[key]
+        del self._order[key]
+
+    def _unindex(self, key: str):
+        name = self._names[key]
+        for gram in self._ngrams(name):
+            ids = self._grams.get(gram)
+            if ids is not None:
+                ids.discard(key)
+                if not ids:
+                    del self._grams[gram]
+        ids = self._exact[name]
+        ids.discard(key)
+        if not ids:
+            del self._exact[name]
+        i = bisect.bisect_left(self._sorted, (name, key))
+        del self._sorted[i]
+
+    def _prefix(self, prefix: str, limit: int = None):
+        start = bisect.bisect_left(self._sorted, (prefix,))
+        stop = len(self._sorted) if limit is None else min(len(self._sorted), start + limit)
+        matches = []
+        for i in range(start, stop):
+            name, key = self._sorted[i]
+            if not name.startswith(prefix):
+                break
+            matches.append(key)
+        return matches
+
+    def complete(self, prefix: str, limit: int = 25):
+        """Up to limit ids whose name starts with prefix (case-insensitive), in name order; for autocomplete"""
+        return self._prefix(prefix.lower(), limit)
+
+    def exact(self, name: str):
+        """Ids whose name is exactly name (case-insensitive), in insertion order"""
+        return sorted(self._exact.get(name.lower(), ()), key=self._order.__getitem__)
+
+    def search(self, query: str):
+        """Ids whose username contains query (case-insensitive), in insertion order"""
+        q = query.lower()
+        if len(q) < self.N:
+            # Too short to have a trigram; the lowercased names are still cheaper than a full scan
+            found = [key for key, name in self._names.items() if q in name]
+            return found
+
+        postings = []
+        for gram in self._ngrams(q):
+            ids = self._grams.get(gram)
+            if not ids:
+                return []
+            postings.append(ids)
+        postings.sort(key=len)
+        rarest = postings[0]
+
+        # Exact fast path: nothing beyond the exact hits can contain q
+        exact = self._exact.get(q)
+        if exact is not None and len(exact) == len(rarest):
+            return sorted(exact, key=self._order.__getitem__)
+
+        # Prefix fast path: every candidate is a prefix hit, so no verification needed
+        prefixed = self._prefix(q)
+        if len(prefixed) == len(rarest):
+            return sorted(prefixed, key=self._order.__getitem__)
+
+        candidates = set(rarest)
+        for ids in postings[1:]:
+            candidates &= ids
+        found = [key for key in candidates if q in self._names[key]]
+        found.sort(key=self._order.__getitem__)
+        return found
+
+
+# ---------------- Member Index ---------------- #
+class MemberIndex:
+    """One NameIndex of member names per guild, so user lookups skip guild.members.
+
+    Built when a guild becomes available and patched from member
+    join/remove and user (rename) events.
+    """
+
+    def __init__(self):
+        self._guilds = {}
+
+    def build(self, guild):
+        index = NameIndex()
+        for member in guild.members:
+            index.add(member.id, member.name)
+        self._guilds[guild.id] = index
+        return index
+
+    def drop(self, guild_id: int):
+        self._guilds.pop(guild_id, None)
+
+    def add(self, member):
+        index = self._guilds.get(member.guild.id)
+        if index is not None:
+            index.add(member.id, member.name)
+
+    def remove(self, member):
+        index = self._guilds.get(member.guild.id)
+        if index is not None:
+            index.remove(member.id)
+
+    def search(self, guild, query: str):
+        """Members of guild whose name contains query (case-insensitive); just the exact match when there is one"""
+        index = self._guilds.get(guild.id)
+        if index is None:
+            # Events for this guild haven't arrived yet; build it now rather than scan every time
+            index = self.build(guild)
+        members = []
+        # Like League.find_player_by_name, so "bob" can still be added while "bobby" exists
+        for member_id in index.exact(query) or index.search(query):
+            member = guild.get_member(member_id)
+            if member is not None:
+                members.append(member)
+        return members
+
+
+# ---------------- Membership Index ---------------- #
+class MembershipIndex:
+    """Player id -> team name, kept alongside each team's member set.
+
+    In memory a team's "members" is an insertion-ordered dict used as an
+    ordered set (see members_to_list / members_from_list for the on-disk
+    list form), so membership checks, moves and removals are all O(1).
+    """
+
+    def __init__(self, teams: dict):
+        self._teams = teams
+        self._team_of = {}
+        for team_name, data in teams.items():
+            for player_id in data["members"]:
+                self._team_of[player_id] = team_name
+
+    def team_of(self, player_id: str):
+        return self._team_of.get(player_id)
+
+    def add(self, player_id: str, team_name: str):
+        """Put a player on a team, taking them off any previous one; returns the old team"""
+        old_team = self.remove(player_id)
+        self._teams[team_name]["members"][player_id] = None
+        self._team_of[player_id] = team_name
+        return old_team
+
+    def remove(self, player_id: str):
+        """Take a player off their team; returns the team they were on, if any"""
+        team_name = self._team_of.pop(player_id, None)
+        if team_name is not None and team_name in self._teams:
+            self._teams[team_name]["members"].pop(player_id, None)
+        return team_name
+
+    def drop_team(self, team_name: str):
+        """Forget every membership of a team that is being deleted"""
+        for player_id in self._teams[team_name]["members"]:
+            if self._team_of.get(player_id) == team_name:
+                del self._team_of[player_id]
+
+
+def members_from_list(team: dict) -> dict:
+    """Turn a team loaded from disk into its in-memory form"""
+    team["members"] = dict.fromkeys(team.get("members", []))
+    return team
+
+def members_to_list(team: dict) -> dict:
+    """Copy of a team in its on-disk form, with members as a JSON list"""
+    encoded = dict(team)
+    encoded["members"] = list(team["members"])
+    return encoded
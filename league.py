@@ -0,0 +1,371 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+
+import persistence
+from metrics import metrics
+from indexes import MembershipIndex, NameIndex, members_from_list, members_to_list
+from ranking import Leaderboard
+from player_store import Player, PlayerStore
+from matches import MatchLog, parse_match, resolve_names
+from render_cache import RenderCache
+from ratings import rate_match
+from unit_of_work import LockTable, UnitOfWork
+
+
+# ---------------- Settings ---------------- #
+# Most guilds kept in memory at once; the least recently used idle ones are unloaded first
+GUILD_CACHE_SIZE = int(os.getenv("GUILD_CACHE_SIZE", "50"))
+# Seconds without a command before a guild is unloaded
+GUILD_IDLE_SECONDS = float(os.getenv("GUILD_IDLE_SECONDS", "1800"))
+GUILD_SWEEP_SECONDS = float(os.getenv("GUILD_SWEEP_SECONDS", "60"))
+
+
+# ---------------- League ---------------- #
+class League:
+    """One guild's players, teams, indexes and match history, backed by its own shard.
+
+    Everything the commands used to keep in module globals lives here, so
+    team names never collide between servers and a guild's memory can be
+    released as a unit.
+    """
+
+    def __init__(self, guild_id: int, service: persistence.PersistenceService, players: PlayerStore, teams: dict,
+                 match_totals=(0, 0)):
+        self.guild_id = guild_id
+        self.service = service
+        # Players live in a columnar store; Player objects are views onto its rows
+        self.player_stats = players
+        self.team_stats = teams
+        self.training_levels = self.player_stats.training_levels
+        for team in self.team_stats.values():
+            members_from_list(team)
+        service.bind({
+            "players": self.player_stats,
+            "TEAMS": self.team_stats,
+            "training_levels": self.training_levels
+        }, encoders={"TEAMS": members_to_list, "players": Player.to_dict, "training_levels": int})
+
+        # player id -> team, mirroring each team's member set
+        self.membership = MembershipIndex(self.team_stats)
+        # Trigram index over usernames; kept in sync by addplayer/deleteplayer
+        self.name_index = NameIndex()
+        for player_id, player in self.player_stats.items():
+            self.name_index.add(player_id, player.username)
+        # The same index over team names (keyed by name); kept in sync by addteam/deleteteam
+        self.team_index = NameIndex()
+        for team_name in self.team_stats:
+            self.team_index.add(team_name, team_name)
+        # League and per-team ordering by (win rate, username) and by (rating
+        # skill, username); refreshed whenever a player changes
+        self.leaderboard = Leaderboard()
+        self.leaderboard.rebuild(self.player_stats.ranking_entries())
+        self.rating_board = Leaderboard()
+        self.rating_board.rebuild(self.player_stats.rating_entries())
+        # Append-only match history; only the next id and the count are kept in memory
+        self.match_log = MatchLog(*match_totals)
+        # Held while rebuildratings replays the history. Result recording checks it
+        # under its unit locks with no await before committing, and the replay reads
+        # the history only after pending events are flushed, so no result slips in between
+        self.ratings_lock = asyncio.Lock()
+        # Per-team and per-player locks behind unit()
+        self.locks = LockTable()
+        # Bumped by every change, so rendered views keyed by it never go stale
+        self.version = 0
+        self.renders = RenderCache()
+
+        self.pins = 0                 # commands currently using this league
+        self.last_used = time.monotonic()
+
+    @classmethod
+    def load(cls, guild_id: int):
+        """Read a guild's shard from disk; blocking, so call it off the event loop"""
+        service = persistence.PersistenceService(persistence.shard_dir(guild_id))
+        players, teams = service.load_state()
+        return cls(guild_id, service, players, teams, service.match_totals())
+
+    def unit(self, teams=(), players=()):
+        """A UnitOfWork holding the locks for these teams and player ids"""
+        return UnitOfWork(self, teams, players)
+
+    def record_change(self, table: str, key: str):
+        """Queue one changed entry (or its removal) for the background writer"""
+        self.version += 1
+        self.service.record(table, key)
+
+    def find_player_by_name(self, name: str):
+        """Players whose username contains name; just the exact match when there is one (autocompleted names)"""
+        player_ids = self.name_index.exact(name) or self.name_index.search(name)
+        return [(player_id, self.player_stats[player_id]) for player_id in player_ids]
+
+    # -------- rankings -------- #
+    def board(self, order: str):
+        return self.rating_board if order == "rating" else self.leaderboard
+
+    def refresh_ranking(self, player_id: str):
+        player = self.player_stats.get(player_id)
+        if player is None:
+            self.leaderboard.remove(player_id)
+            self.rating_board.remove(player_id)
+            return
+        self.leaderboard.update(player_id, player.win_percent(), player.username, player.team)
+        self.rating_board.update(player_id, player.skill, player.username, player.team)
+
+    def _ranked_rows(self, player_ids):
+        rows = []
+        for player_id in player_ids:
+            player = self.player_stats[player_id]
+            rows.append((player_id, player.username, player.wins, player.losses, player.win_percent(),
+                         player.rating, player.rd))
+        return rows
+
+    # With the SQLite backend these run as indexed queries on the persistence
+    # worker; otherwise they are computed from the in-memory dicts.
+    async def ranked_players(self, offset: int = 0, limit: int = None, order: str = "win_rate"):
+        """(id, username, wins, losses, win_rate, rating, rd) for players, best first by order"""
+        if self.service.store is not None:
+            return await self.service.query(
+                self.service.store.ranked_players, -1 if limit is None else limit, offset, order)
+        return self._ranked_rows(self.board(order).top(limit, offset=offset))
+
+    async def team_ranking(self, team: str, offset: int = 0, limit: int = None, order: str = "win_rate"):
+        """(id, username, wins, losses, win_rate, rating, rd) for one team's members, best first by order"""
+        if self.service.store is not None:
+            return await self.service.query(
+                self.service.store.team_ranking, team, -1 if limit is None else limit, offset, order)
+        return self._ranked_rows(self.board(order).top(limit, team=team, offset=offset))
+
+    async def team_roster_by_level(self, team: str):
+        """(level, username, wins, losses, win_rate) for one team, grouped by training level"""
+        if self.service.store is not None:
+            return await self.service.query(self.service.store.team_roster_by_level, team)
+        rows = []
+        for player_id in self.team_stats[team]["members"]:
+            player = self.player_stats.get(player_id)
+            if player:
+                rows.append((player.level, player.username, player.wins, player.losses, player.win_percent()))
+        rows.sort(key=lambda x: x[0])
+        return rows
+
+    # -------- players -------- #
+    def store_new_player(self, user, team_name: str, level_index: int):
+        """Record a new player on a team and update every index that tracks players"""
+        player_id = str(user.id)
+        self.membership.add(player_id, team_name)
+        self.player_stats.add(player_id, user.name, team=team_name, level=level_index)
+        self.name_index.add(player_id, user.name)
+        self.refresh_ranking(player_id)
+        self.record_change("TEAMS", team_name)
+        self.record_change("training_levels", player_id)
+        self.record_change("players", player_id)
+
+    # -------- matches -------- #
+    def build_match(self, text: str):
+        """Validate one `<winner> <loser> <players>` result; returns (winner, loser, winner ids, loser ids) or errors"""
+        try:
+            winner, loser, winner_names, loser_names = parse_match(text)
+        except ValueError as e:
+            return None, [str(e)]
+        errors = [f"Team {team} does not exist" for team in (winner, loser) if team not in self.team_stats]
+        winner_ids, resolve_errors = resolve_names(winner_names, self.find_player_by_name)
+        errors += resolve_errors
+        if loser_names is None:
+            # No explicit sides: everyone plays for the team they are on
+            named = winner_ids
+            winner_ids, loser_ids = [], []
+            for player_id in named:
+                team = self.player_stats[player_id].team
+                if team == winner:
+                    winner_ids.append(player_id)
+                elif team == loser:
+                    loser_ids.append(player_id)
+                else:
+                    errors.append(f"{self.player_stats[player_id].username} isn't on {winner} or {loser}; "
+                                  f"list the sides as `winners | losers`")
+        else:
+            loser_ids, resolve_errors = resolve_names(loser_names, self.find_player_by_name)
+            errors += resolve_errors
+        seen = set()
+        for player_id in winner_ids + loser_ids:
+            if player_id in seen:
+                errors.append(f"{self.player_stats[player_id].username} is listed more than once")
+            seen.add(player_id)
+        if errors:
+            return None, errors
+        return (winner, loser, winner_ids, loser_ids), []
+
+    def record_result(self, winner: str, loser: str, winner_ids, loser_ids):
+        """Append a match event and apply it to the player and team totals"""
+        event = self.match_log.new_event(winner, loser, winner_ids, loser_ids)
+        self.service.append_event(event)
+        for team, key in ((winner, "wins"), (loser, "losses")):
+            self.team_stats[team][key] = self.team_stats[team].get(key, 0) + 1
+            self.record_change("TEAMS", team)
+        winners = [self.player_stats[player_id] for player_id in winner_ids]
+        losers = [self.player_stats[player_id] for player_id in loser_ids]
+        for player in winners:
+            player.record_win()
+        for player in losers:
+            player.record_loss()
+        # Ratings move in O(participants); nobody else is touched
+        new_winners, new_losers = rate_match([(p.rating, p.rd) for p in winners], [(p.rating, p.rd) for p in losers])
+        for player, (rating, rd) in zip(winners + losers, new_winners + new_losers):
+            player.rating, player.rd = rating, rd
+        for player_id in winner_ids + loser_ids:
+            self.refresh_ranking(player_id)
+            self.record_change("players", player_id)
+        return event
+
+
+# ---------------- League Registry ---------------- #
+class LeagueRegistry:
+    """Loads each guild's League on first use and unloads it again when idle.
+
+    Commands pin the league they run against, so a guild is never unloaded
+    (and later reloaded as a second copy) while one of its commands is still
+    in flight. Unpinned leagues are unloaded after GUILD_IDLE_SECONDS, or
+    least recently used first once more than GUILD_CACHE_SIZE are loaded;
+    unloading flushes the shard first.
+    """
+
+    def __init__(self, capacity: int = GUILD_CACHE_SIZE, idle_seconds: float = GUILD_IDLE_SECONDS):
+        self.capacity = capacity
+        self.idle_seconds = idle_seconds
+        self._leagues = OrderedDict()   # guild id -> League, least recently used first
+        self._loading = {}              # guild id -> task reading its shard
+        self._closing = {}              # guild id -> task flushing an unloaded league
+        self._warming = {}              # guild id -> background load started by loaded()
+        self._sweeper = None
+        self.preloading = None          # task warming the cache at startup; result is (guilds, seconds)
+
+    def __len__(self):
+        return len(self._leagues)
+
+    def __contains__(self, guild_id):
+        return guild_id in self._leagues
+
+    async def acquire(self, guild_id: int) -> League:
+        """The guild's League, loaded if needed and pinned until release()"""
+        closing = self._closing.get(guild_id)
+        if closing is not None:
+            await asyncio.shield(closing)
+        league = self._leagues.get(guild_id)
+        if league is None:
+            task = self._loading.get(guild_id)
+            if task is None:
+                task = self._loading[guild_id] = asyncio.ensure_future(asyncio.to_thread(League.load, guild_id))
+                task.add_done_callback(lambda _: self._loading.pop(guild_id, None))
+            with metrics.io("shard_load"):
+                league = await asyncio.shield(task)
+            league = self._leagues.setdefault(guild_id, league)
+        self._leagues.move_to_end(guild_id)
+        league.pins += 1
+        league.last_used = time.monotonic()
+        if len(self._leagues) > self.capacity:
+            self._evict_over_budget()
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = asyncio.get_running_loop().create_task(self._sweep())
+        return league
+
+    def loaded(self, guild_id: int):
+        """The guild's League if it is already in memory, else None after starting its load in the background.
+
+        For callers on a deadline (slash-command autocomplete) that must not
+        wait out a cold shard load. The result is not pinned, so use it
+        before the next await.
+        """
+        league = self._leagues.get(guild_id)
+        if league is not None:
+            self._leagues.move_to_end(guild_id)
+            league.last_used = time.monotonic()
+        elif guild_id not in self._warming:
+            task = self._warming[guild_id] = asyncio.get_running_loop().create_task(self._preload([guild_id]))
+            task.add_done_callback(lambda _: self._warming.pop(guild_id, None))
+        return league
+
+    def start_preload(self):
+        """Load the most recently written shards in the background, up to capacity.
+
+        Called from the extension's setup, so shards are read while the
+        gateway connection is being established instead of on each guild's
+        first command.
+        """
+        guild_ids = persistence.known_shards()[:self.capacity]
+        self.preloading = asyncio.get_running_loop().create_task(self._preload(guild_ids))
+        return self.preloading
+
+    async def _preload(self, guild_ids):
+        started = time.perf_counter()
+        loaded = 0
+        for guild_id in guild_ids:
+            try:
+                league = await self.acquire(guild_id)
+            except Exception as e:
+                print(f"⚠️ Could not preload guild {guild_id}: {e}")
+                continue
+            self.release(league)
+            loaded += 1
+        return loaded, time.perf_counter() - started
+
+    def pin(self, league: League):
+        """Keep an already acquired league loaded past its command; returns the matching release"""
+        league.pins += 1
+        return lambda: self.release(league)
+
+    def release(self, league: League):
+        league.pins -= 1
+        league.last_used = time.monotonic()
+
+    def _unload(self, guild_id: int):
+        league = self._leagues.pop(guild_id)
+        task = self._closing[guild_id] = asyncio.ensure_future(league.service.close())
+        task.add_done_callback(lambda _: self._closing.pop(guild_id, None))
+
+    def _evict_over_budget(self):
+        for guild_id in [gid for gid, league in self._leagues.items() if league.pins == 0]:
+            if len(self._leagues) <= self.capacity:
+                break
+            self._unload(guild_id)
+
+    def evict_idle(self):
+        cutoff = time.monotonic() - self.idle_seconds
+        for guild_id, league in list(self._leagues.items()):
+            if league.pins == 0 and league.last_used < cutoff:
+                self._unload(guild_id)
+
+    async def _sweep(self):
+        while self._leagues:
+            await asyncio.sleep(GUILD_SWEEP_SECONDS)
+            self.evict_idle()
+
+    async def close(self):
+        """Flush and unload every league (shutdown)"""
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+        if self.preloading is not None and not self.preloading.done():
+            self.preloading.cancel()
+            await asyncio.gather(self.preloading, return_exceptions=True)
+        for guild_id in list(self._leagues):
+            self._unload(guild_id)
+        if self._closing:
+            await asyncio.gather(*self._closing.values(), return_exceptions=True)
+
+
+leagues = LeagueRegistry()
+
+
+# ---------------- Command Hooks ---------------- #
+# Each guild's League (players, teams, indexes) is loaded on its first
+# command and pinned for as long as the command runs. The bot's invoke
+# hooks in main.py call these. Commands that use ctx.league are marked
+# guild_only, so the None it gets outside a guild is never dereferenced.
+async def acquire_league(ctx):
+    ctx.league = await leagues.acquire(ctx.guild.id) if ctx.guild is not None else None
+
+async def release_league(ctx):
+    """Unpin the command's league; safe to call more than once"""
+    league = getattr(ctx, "league", None)
+    if league is not None:
+        ctx.league = None
+        leagues.release(league)
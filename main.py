@@ -1,10 +1,28 @@
+import time
+STARTED = time.perf_counter()  # before any other import, so the report covers them
+
 import discord
 from discord.ext import commands
 import os
+import sys
+import traceback
 from dotenv import load_dotenv
 
+PROCESS_ENV = dict(os.environ)  # the real environment, before .env is merged into it
 load_dotenv()
 
+import persistence  # after load_dotenv so file settings come from .env
+import roster_pool
+from league import acquire_league, leagues, release_league
+from metrics import metrics
+from channel_policy import NoticeCooldown, channel_policy
+
+# Register the slash versions of the hybrid commands with Discord on startup
+SYNC_APP_COMMANDS = os.getenv("SYNC_APP_COMMANDS", "1") != "0"
+
+IMPORT_SECONDS = time.perf_counter() - STARTED
+SETUP_SECONDS = None
+
 intents = discord.Intents.default()
 intents.members = True
 intents.message_content = True
@@ -12,37 +30,129 @@ intents.message_content = True
 bot = commands.Bot(command_prefix="<", intents=intents)
 
 # ============ CHANNEL RESTRICTION ============
-ALLOWED_CHANNEL_IDS = [
-    int(id.strip()) 
-    for id in os.getenv('ALLOWED_CHANNEL_IDS', '').split(',') 
-    if id.strip()
-]
+# Allowed channels are precomputed per guild (see channel_policy.py) and
+# reloadable with <reloadchannels; each (channel, user) pair gets at most one
+# "wrong channel" notice per REJECTION_COOLDOWN_SECONDS, so spam costs no API calls.
+rejection_notices = NoticeCooldown()
+# <reloadchannels re-reads .env; settings missing there fall back to the real environment only
+channel_policy.environ = PROCESS_ENV
 
 @bot.check
 async def globally_block_channels(ctx):
     """Block all commands outside allowed channels"""
-    if not ALLOWED_CHANNEL_IDS:
-        # If no channels configured, allow all (for testing)
+    if channel_policy.allows(ctx.guild.id if ctx.guild else None, ctx.channel.id):
         return True
-    
-    if ctx.channel.id not in ALLOWED_CHANNEL_IDS:
+
+    if rejection_notices.ready((ctx.channel.id, ctx.author.id)):
         await ctx.send(f"❌ This bot only works in designated team management channels!")
-        return False
-    return True
+    return False
+# =============================================
+
+# ============ COMMAND HOOKS ============
+# discord.py keeps a single before/after invoke hook, so both jobs share them
+@bot.before_invoke
+async def before_command(ctx):
+    metrics.command_started(ctx)
+    if ctx.interaction is not None and ctx.guild is not None and ctx.guild.id not in leagues:
+        # Slash commands must answer within 3 seconds; a cold shard load may take longer
+        await ctx.defer()
+    await acquire_league(ctx)
+
+@bot.after_invoke
+async def after_command(ctx):
+    await release_league(ctx)
+    metrics.command_finished(ctx)
+
+@bot.listen("on_command_error")
+async def release_after_error(ctx, error):
+    # Slash (hybrid) commands skip the after hook when they fail; both calls are idempotent
+    await release_league(ctx)
+    metrics.command_finished(ctx)
+    # Any on_command_error listener switches off discord.py's default handler, so report everything here
+    if isinstance(error, commands.CommandNotFound):
+        return
+    if isinstance(error, commands.NoPrivateMessage):
+        # League commands are marked guild_only; say so instead of failing silently in DMs
+        await ctx.send("❌ This command only works in a server.")
+    elif isinstance(error, commands.MissingPermissions):
+        await ctx.send("❌ You don't have permission to use this command.")
+    elif isinstance(error, commands.CheckFailure):
+        return  # the channel check has already sent (or rate-limited) its notice
+    elif isinstance(error, commands.UserInputError):
+        await ctx.send(f"❌ {error} Use `<leadershelp` for usage.")
+    else:
+        print(f"⚠️ Command {ctx.command} failed:", file=sys.stderr)
+        traceback.print_exception(type(error), error, error.__traceback__, file=sys.stderr)
+        await ctx.send("⚠️ Something went wrong running that command. The error has been logged.")
+# =============================================
+
+# ============ STARTUP TIMING ============
+startup_reported = False
+
+async def report_startup(ready_seconds: float):
+    """Print how long each startup phase took; loading runs alongside the login, so it is awaited here"""
+    line = f"⏱️ Startup: import {IMPORT_SECONDS:.2f}s, setup {SETUP_SECONDS:.2f}s, ready after {ready_seconds:.2f}s"
+    if leagues.preloading is not None:
+        try:
+            guilds, load_seconds = await leagues.preloading
+            line += f", load {load_seconds:.2f}s ({guilds} guild(s))"
+        except asyncio.CancelledError:
+            line += ", load cancelled"
+    print(line)
 # =============================================
 
 @bot.event
 async def on_ready():
+    global startup_reported
     print(f"✅ Logged in as {bot.user} (ID: {bot.user.id})")
-    if ALLOWED_CHANNEL_IDS:
-        print(f"🔒 Bot restricted to {len(ALLOWED_CHANNEL_IDS)} channel(s)")
+    if channel_policy.restricted:
+        print(f"🔒 Bot restricted to {len(channel_policy.default or ())} channel(s) everywhere, "
+              f"{len(channel_policy.guilds)} guild(s) with their own list")
     else:
-        print("⚠️ No channel restrictions (set ALLOWED_CHANNEL_IDS in .env)")
+        print("⚠️ No channel restrictions (set ALLOWED_CHANNEL_IDS or GUILD_CHANNEL_IDS in .env)")
     print("------")
+    # on_ready fires again after reconnects; only the first one is startup
+    if not startup_reported:
+        startup_reported = True
+        if SYNC_APP_COMMANDS:
+            try:
+                synced = await bot.tree.sync()
+                print(f"⚡ Synced {len(synced)} slash command(s)")
+            except discord.HTTPException as e:
+                print(f"⚠️ Could not sync slash commands: {e}")
+        await report_startup(time.perf_counter() - STARTED)
 
 # Properly load the commands cog synchronously before bot.run()
 async def setup():
-    await bot.load_extension("commands")  # loads commands.py as a Cog
+    global SETUP_SECONDS
+    started = time.perf_counter()
+    await bot.load_extension("commands")  # loads commands.py as a Cog; it starts loading shards
+    SETUP_SECONDS = time.perf_counter() - started
+    # Event-loop lag sampling, the Prometheus dump, and Discord API time per command
+    metrics.instrument_http(bot.http)
+    metrics.start()
+
+# ============ LEGACY DATA ============
+# Data now lives in DATA_DIR/<guild id>/. A single-server install's stats.json
+# (journal, database, match log) next to the bot goes to LEGACY_GUILD_ID, or to
+# the only server the bot is in; with several servers we stop rather than start
+# every league empty, which would look like the data was lost.
+async def adopt_legacy_data():
+    names = persistence.legacy_files()
+    if not names or persistence.LEGACY_GUILD_ID:
+        return
+    guilds = [guild async for guild in bot.fetch_guilds(limit=2)]
+    if len(guilds) != 1:
+        raise SystemExit(f"❌ Found data from a single-server install ({', '.join(names)}) but the bot is in "
+                         f"{'no' if not guilds else 'several'} server(s). Set LEGACY_GUILD_ID to the server it "
+                         f"belongs to and restart.")
+    try:
+        moved = persistence.adopt_legacy(guilds[0].id)
+    except FileExistsError as e:
+        raise SystemExit(f"❌ Could not move the single-server data into {guilds[0].name}: {e}. "
+                         f"Move or remove one copy and restart.")
+    print(f"📦 Moved {', '.join(moved)} into the shard for {guilds[0].name} ({guilds[0].id})")
+# =============================================
 
 # Use Discord token from Railway environment variables
 TOKEN = os.getenv("DISCORD_TOKEN")
@@ -50,8 +160,21 @@ TOKEN = os.getenv("DISCORD_TOKEN")
 # Run bot with the async setup
 async def main():
     async with bot:
+        # Logged in (REST only) first, so legacy files are placed before any shard is loaded
+        await bot.login(TOKEN)
+        await adopt_legacy_data()
         await setup()
-        await bot.start(TOKEN)
+        try:
+            await bot.connect()
+        finally:
+            # Write out anything still waiting in every loaded guild's coalescing window
+            await leagues.close()
+            metrics.stop()
+            persistence.shutdown()
+            roster_pool.shutdown()
 
 import asyncio
-asyncio.run(main())
\ No newline at end of file
+
+# Guarded so roster worker processes (spawned, they re-import this module) don't start a bot
+if __name__ == "__main__":
+    asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,84 @@
+import re
+import time
+
+
+# "<winner> <loser> <players>", players split into sides by "|" or "vs"
+_SIDES = re.compile(r"\s*(?:\||\bvs\.?(?=\s))\s*", re.IGNORECASE)
+_NAMES = re.compile(r"[,\s]+")
+
+
+def parse_match(text: str):
+    """Split `<winner> <loser> <players>` into its parts.
+
+    Players are separated by commas or spaces. They may be split into
+    `winners | losers`; otherwise each player's side is their team.
+    Returns (winner, loser, winner names, loser names) where the loser names
+    are None when no sides were given. Raises ValueError on bad input.
+    """
+    parts = text.split(None, 2)
+    if len(parts) < 3:
+        raise ValueError("expected `<winner> <loser> <players>`")
+    winner, loser, players = parts
+    if winner == loser:
+        raise ValueError("a team can't play itself")
+    sides = _SIDES.split(players.strip())
+    if len(sides) > 2:
+        raise ValueError("use a single `|` between the winners and the losers")
+    names = [[name for name in _NAMES.split(side) if name] for side in sides]
+    if not any(names):
+        raise ValueError("no players listed")
+    if len(names) == 1:
+        return winner, loser, names[0], None
+    return winner, loser, names[0], names[1]
+
+
+def resolve_names(names, find_player):
+    """Resolve player names to ids; an exact username beats substring matches.
+
+    find_player(name) returns the [(player_id, player)] matches, like
+    find_player_by_name. Returns ([player_id], errors).
+    """
+    ids = []
+    errors = []
+    for name in names:
+        matches = find_player(name)
+        if len(matches) > 1:
+            exact = [(pid, p) for pid, p in matches if p.username.lower() == name.lower()]
+            if len(exact) == 1:
+                matches = exact
+        if not matches:
+            errors.append(f"No player found matching `{name}`")
+        elif len(matches) > 1:
+            listed = ", ".join(player.username for _, player in matches[:5])
+            errors.append(f"`{name}` matches several players ({listed}); be more specific")
+        else:
+            ids.append(matches[0][0])
+    return ids, errors
+
+
+# ---------------- Match Log ---------------- #
+class MatchLog:
+    """Hands out match ids and builds the events for the append-only history.
+
+    An event is {"id", "ts", "winner", "loser", "winners", "losers"}, the
+    last two being the ids of the players on each side. Events are never
+    edited; totals are derived from them as they are recorded.
+    """
+
+    def __init__(self, last_id: int = 0, count: int = 0):
+        # Just the totals are loaded (see PersistenceService.match_totals), never the history
+        self.next_id = last_id + 1
+        self.count = count
+
+    def new_event(self, winner: str, loser: str, winners, losers, ts: float = None):
+        event = {
+            "id": self.next_id,
+            "ts": time.time() if ts is None else ts,
+            "winner": winner,
+            "loser": loser,
+            "winners": list(winners),
+            "losers": list(losers)
+        }
+        self.next_id += 1
+        self.count += 1
+        return event
@@ -0,0 +1,228 @@
+import asyncio
+import contextvars
+import os
+import time
+from array import array
+from contextlib import contextmanager
+
+
+# ---------------- Settings ---------------- #
+# Samples kept per series; percentiles cover the most recent ones
+METRICS_RING_SIZE = int(os.getenv("METRICS_RING_SIZE", "1024"))
+# How often the event-loop lag sampler wakes up
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.5"))
+# Prometheus text-format dump (e.g. for node_exporter's textfile collector); unset to disable
+METRICS_FILE = os.getenv("METRICS_FILE")
+METRICS_DUMP_SECONDS = float(os.getenv("METRICS_DUMP_SECONDS", "15"))
+
+QUANTILES = (0.5, 0.9, 0.99)
+PHASES = ("total", "compute", "io", "discord")
+
+
+# ---------------- Ring Buffer ---------------- #
+class LatencyRing:
+    """The last `size` samples (seconds) in a fixed array, plus lifetime count and sum.
+
+    Adding a sample is an array store and two additions, so it is cheap
+    enough to run on every command; percentiles are only computed when
+    someone asks for them.
+    """
+
+    __slots__ = ("samples", "size", "next", "count", "total")
+
+    def __init__(self, size: int = METRICS_RING_SIZE):
+        self.samples = array("d", bytes(8 * size))
+        self.size = size
+        self.next = 0
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, seconds: float):
+        self.samples[self.next] = seconds
+        self.next = (self.next + 1) % self.size
+        self.count += 1
+        self.total += seconds
+
+    def quantiles(self, qs=QUANTILES):
+        """Nearest-rank quantiles of the samples in the ring"""
+        values = sorted(self.samples[:min(self.count, self.size)])
+        if not values:
+            return [0.0 for _ in qs]
+        return [values[min(len(values) - 1, int(q * len(values)))] for q in qs]
+
+
+# ---------------- Command Timing ---------------- #
+class CommandTiming:
+    """Time one command spent waiting on disk (io) and on Discord's API (discord)"""
+
+    __slots__ = ("started", "io", "discord", "token")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.io = 0.0
+        self.discord = 0.0
+        self.token = None
+
+
+# The running command's timing; tasks it starts inherit it
+_current = contextvars.ContextVar("command_timing", default=None)
+
+
+# ---------------- Metrics ---------------- #
+class Metrics:
+    """Per-command latency split into compute / io / discord, plus named timers.
+
+    command_started/command_finished bracket a command (the bot's
+    before/after invoke hooks); io() wraps awaited disk work and
+    instrument_http() every REST call, so their time is charged to the
+    command that is waiting on it. Whatever remains is compute (including
+    lock waits). Timers also cover work with no command attached:
+    persistence writes, shard loads, event-loop lag.
+    """
+
+    def __init__(self, ring_size: int = METRICS_RING_SIZE):
+        self.ring_size = ring_size
+        self.commands = {}   # command name -> {phase: LatencyRing}
+        self.timers = {}     # timer name -> LatencyRing
+        self.counters = {}   # counter name -> running total
+        self._tasks = []
+
+    def increment(self, name: str, amount: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def observe(self, name: str, seconds: float):
+        ring = self.timers.get(name)
+        if ring is None:
+            ring = self.timers[name] = LatencyRing(self.ring_size)
+        ring.add(seconds)
+
+    @contextmanager
+    def timer(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    @contextmanager
+    def io(self, name: str):
+        """Like timer(), and the time also counts as the running command's I/O"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.observe(name, elapsed)
+            timing = _current.get()
+            if timing is not None:
+                timing.io += elapsed
+
+    # -------- commands -------- #
+    def command_started(self, ctx):
+        timing = ctx.timing = CommandTiming()
+        timing.token = _current.set(timing)
+
+    def command_finished(self, ctx):
+        timing = getattr(ctx, "timing", None)
+        if timing is None:
+            return
+        ctx.timing = None
+        try:
+            _current.reset(timing.token)
+        except (ValueError, RuntimeError):
+            pass  # finished in another context than it started (or twice); that context ends with its task
+        total = time.perf_counter() - timing.started
+        phases = self.commands.get(ctx.command.qualified_name)
+        if phases is None:
+            phases = self.commands[ctx.command.qualified_name] = {
+                phase: LatencyRing(self.ring_size) for phase in PHASES
+            }
+        phases["total"].add(total)
+        phases["compute"].add(max(0.0, total - timing.io - timing.discord))
+        phases["io"].add(timing.io)
+        phases["discord"].add(timing.discord)
+
+    def instrument_http(self, http):
+        """Time every Discord REST call made through http (the bot's HTTPClient)"""
+        request = http.request
+
+        async def timed_request(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await request(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                self.observe("discord_http", elapsed)
+                timing = _current.get()
+                if timing is not None:
+                    timing.discord += elapsed
+
+        http.request = timed_request
+
+    # -------- background tasks -------- #
+    async def sample_loop_lag(self, interval: float = LOOP_LAG_INTERVAL):
+        """Record how late the event loop wakes up from a fixed sleep"""
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(interval)
+            self.observe("loop_lag", max(0.0, loop.time() - start - interval))
+
+    async def dump_periodically(self, path: str, interval: float = METRICS_DUMP_SECONDS):
+        while True:
+            await asyncio.sleep(interval)
+            await asyncio.to_thread(self.dump, path, self.prometheus())
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        self._tasks.append(loop.create_task(self.sample_loop_lag()))
+        if METRICS_FILE:
+            self._tasks.append(loop.create_task(self.dump_periodically(METRICS_FILE)))
+
+    def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks.clear()
+        if METRICS_FILE:
+            self.dump(METRICS_FILE, self.prometheus())
+
+    # -------- export -------- #
+    def prometheus(self) -> str:
+        """Every series in Prometheus text format, as summaries in seconds"""
+        lines = [
+            "# HELP league_command_seconds Command latency by phase (compute, io, discord, total).",
+            "# TYPE league_command_seconds summary"
+        ]
+        for command, phases in sorted(self.commands.items()):
+            for phase, ring in phases.items():
+                lines += _summary("league_command_seconds", f'command="{command}",phase="{phase}"', ring)
+        lines += [
+            "# HELP league_timer_seconds Persistence, shard load, Discord HTTP and event-loop lag timings.",
+            "# TYPE league_timer_seconds summary"
+        ]
+        for name, ring in sorted(self.timers.items()):
+            lines += _summary("league_timer_seconds", f'name="{name}"', ring)
+        lines += [
+            "# HELP league_events_total Running counts (render cache hits and misses).",
+            "# TYPE league_events_total counter"
+        ]
+        lines += [f'league_events_total{{name="{name}"}} {value}' for name, value in sorted(self.counters.items())]
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def dump(path: str, text: str):
+        tmp_file = path + ".tmp"
+        with open(tmp_file, "w") as f:
+            f.write(text)
+        os.replace(tmp_file, path)
+
+
+def _summary(metric: str, labels: str, ring: LatencyRing):
+    lines = [f'{metric}{{{labels},quantile="{q}"}} {value:.6f}'
+             for q, value in zip(QUANTILES, ring.quantiles())]
+    lines.append(f"{metric}_sum{{{labels}}} {ring.total:.6f}")
+    lines.append(f"{metric}_count{{{labels}}} {ring.count}")
+    return lines
+
+
+metrics = Metrics()
@@ -0,0 +1,84 @@
+import discord
+
+
+PAGE_SIZE = 10  # rows per embed; well under Discord's 25-field limit
+
+
+def page_count(total: int, page_size: int = PAGE_SIZE) -> int:
+    return max(1, -(-total // page_size))
+
+
+# ---------------- Paginated View ---------------- #
+class PageView(discord.ui.View):
+    """Previous/next buttons that re-render one page into the same message.
+
+    render(page) builds the embed for a 0-based page from the current data
+    and count() returns how many rows there are right now, so nothing is
+    precomputed and pages always reflect the latest ordering. on_close, if
+    given, is called once the buttons stop working.
+    """
+
+    def __init__(self, author_id: int, render, count, page: int = 0, timeout: float = 120.0, on_close=None):
+        super().__init__(timeout=timeout)
+        self.author_id = author_id
+        self.render = render
+        self.count = count
+        self.page = page
+        self.on_close = on_close
+        self.message = None
+        self._sync_buttons()
+
+    def _pages(self) -> int:
+        return page_count(self.count())
+
+    def _sync_buttons(self):
+        self.previous.disabled = self.page <= 0
+        self.next.disabled = self.page >= self._pages() - 1
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.user.id != self.author_id:
+            await interaction.response.send_message("Only the person who ran the command can page through it.", ephemeral=True)
+            return False
+        return True
+
+    async def _show(self, interaction: discord.Interaction, page: int):
+        self.page = min(max(page, 0), self._pages() - 1)
+        self._sync_buttons()
+        embed = await self.render(self.page)
+        await interaction.response.edit_message(embed=embed, view=self)
+
+    @discord.ui.button(label="◀ Prev", style=discord.ButtonStyle.secondary)
+    async def previous(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, self.page - 1)
+
+    @discord.ui.button(label="Next ▶", style=discord.ButtonStyle.secondary)
+    async def next(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, self.page + 1)
+
+    async def on_timeout(self):
+        if self.on_close is not None:
+            self.on_close()
+        for item in self.children:
+            item.disabled = True
+        if self.message is not None:
+            try:
+                await self.message.edit(view=self)
+            except discord.HTTPException:
+                pass
+
+
+async def send_paginated(ctx, render, count, page: int = 0, on_close=None):
+    """Send page `page` of a listing, with navigation buttons when there is more than one page.
+
+    on_close is called when the listing can no longer change pages: right
+    away for a single page, otherwise when the buttons time out.
+    """
+    page = min(max(page, 0), page_count(count()) - 1)
+    embed = await render(page)
+    if page_count(count()) == 1:
+        if on_close is not None:
+            on_close()
+        return await ctx.send(embed=embed)
+    view = PageView(ctx.author.id, render, count, page=page, on_close=on_close)
+    view.message = await ctx.send(embed=embed, view=view)
+    return view.message
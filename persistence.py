@@ -0,0 +1,376 @@
+import asyncio
+import copy
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import metrics
+from player_store import PlayerStore
+from snapshot import encode_snapshot, read_snapshot
+
+
+# ---------------- Files ---------------- #
+# Every guild is its own shard: DATA_DIR/<guild id>/ holds the files below
+DATA_DIR = os.getenv("DATA_DIR", "data")
+DATA_FILE = "stats.json"
+# Compactions write the columnar binary snapshot (see snapshot.py), which is
+# read in preference to DATA_FILE; "json" keeps writing stats.json instead
+SNAPSHOT_FILE = "stats.snap"
+SNAPSHOT_FORMAT = os.getenv("SNAPSHOT_FORMAT", "binary").lower()
+# "json" (stats.json + journal) or "sqlite" (DATABASE_FILE)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "json").lower()
+DATABASE_FILE = os.getenv("DATABASE_FILE", "stats.db")
+# Every mutation is appended here as one JSON line and replayed on top of
+# DATA_FILE at startup; once it grows past JOURNAL_MAX_BYTES it is folded
+# into a fresh snapshot in the background.
+JOURNAL_FILE = os.getenv("JOURNAL_FILE", "stats.journal")
+JOURNAL_MAX_BYTES = int(os.getenv("JOURNAL_MAX_BYTES", "1048576"))
+OLD_JOURNAL_FILE = JOURNAL_FILE + ".old"
+# Match results, one JSON event per line; only ever appended to, never compacted
+MATCH_LOG_FILE = os.getenv("MATCH_LOG_FILE", "matches.jsonl")
+# How long to wait after a mutation before writing, so bursts become one write
+FLUSH_DELAY = float(os.getenv("FLUSH_DELAY", "2.0"))
+# The guild that inherits the files of a single-server install (stats.json etc. next to the bot)
+LEGACY_GUILD_ID = os.getenv("LEGACY_GUILD_ID")
+_LEGACY_FILES = (DATA_FILE, SNAPSHOT_FILE, JOURNAL_FILE, OLD_JOURNAL_FILE, MATCH_LOG_FILE, DATABASE_FILE)
+
+# One worker for every shard keeps appends and compactions strictly ordered
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="persistence")
+
+
+def read_journal(path):
+    """Every entry in a journal file, oldest first"""
+    if not os.path.exists(path):
+        return
+    with open(path, "r") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                # A crash mid-append leaves a torn last line; everything before it is intact
+                continue
+
+def apply_journal(players: PlayerStore, teams: dict, path):
+    """Apply every journal entry in path on top of a PlayerStore and a teams dict"""
+    levels = {}  # a new player's level is journaled just before its row
+    for entry in read_journal(path):
+        table, key, deleted = entry["table"], entry["key"], entry.get("deleted")
+        if table == "TEAMS":
+            if deleted:
+                teams.pop(key, None)
+            else:
+                teams[key] = entry["value"]
+        elif table == "players":
+            if deleted:
+                players.pop(key)
+                levels.pop(key, None)
+                continue
+            level = levels.pop(key, None)
+            if level is None:
+                level = players.training_levels.get(key, 0)
+            players.put(key, entry["value"], level)
+        elif table == "training_levels" and not deleted:
+            if key in players:
+                players.training_levels[key] = entry["value"]
+            else:
+                levels[key] = entry["value"]
+
+def state_to_data(players: PlayerStore, teams: dict):
+    """The stats.json layout of a PlayerStore and a teams dict"""
+    return {
+        "players": {player_id: player.to_dict() for player_id, player in players.items()},
+        "TEAMS": teams,
+        "training_levels": dict(players.training_levels.items())
+    }
+
+def read_match_log(path):
+    if not os.path.exists(path):
+        return
+    with open(path, "r") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue  # torn last line from a crash mid-append
+
+def read_last_match(path, chunk: int = 1 << 16):
+    """The newest intact event in a match log, reading backwards from the end of the file"""
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        size = f.seek(0, os.SEEK_END)
+        while True:
+            start = max(0, size - chunk)
+            f.seek(start)
+            lines = f.read(size - start).splitlines()
+            if start > 0:
+                lines = lines[1:]  # probably cut mid-line
+            for line in reversed(lines):
+                try:
+                    return json.loads(line)
+                except ValueError:
+                    continue  # torn by a crash mid-append
+            if start == 0:
+                return None
+            chunk *= 2
+
+def write_atomic(path, payload):
+    """Write payload (str or bytes) to a temp file and rename it over path"""
+    tmp_file = path + ".tmp"
+    with open(tmp_file, "wb" if isinstance(payload, bytes) else "w") as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file, path)
+
+def legacy_files():
+    """Data files of a single-server install (next to the bot) that no shard has adopted yet"""
+    return [name for name in _LEGACY_FILES if os.path.exists(name)]
+
+def adopt_legacy(guild_id: int):
+    """Move a single-server install's files into guild_id's shard; returns the names moved"""
+    directory = os.path.join(DATA_DIR, str(guild_id))
+    names = legacy_files()
+    clashes = [name for name in names if os.path.exists(os.path.join(directory, name))]
+    if clashes:
+        raise FileExistsError(f"{directory} already has {', '.join(clashes)}")
+    os.makedirs(directory, exist_ok=True)
+    for name in names:
+        os.replace(name, os.path.join(directory, name))
+    return names
+
+def shard_dir(guild_id: int):
+    """The directory holding one guild's files, created (or adopted from a legacy install) on first use"""
+    directory = os.path.join(DATA_DIR, str(guild_id))
+    if not os.path.isdir(directory):
+        if LEGACY_GUILD_ID and str(guild_id) == LEGACY_GUILD_ID:
+            adopt_legacy(guild_id)
+        os.makedirs(directory, exist_ok=True)
+    return directory
+
+def known_shards():
+    """Guild ids with data on disk, most recently written first"""
+    shards = []
+    if os.path.isdir(DATA_DIR):
+        for name in os.listdir(DATA_DIR):
+            directory = os.path.join(DATA_DIR, name)
+            if not name.isdigit() or not os.path.isdir(directory):
+                continue
+            written = max((entry.stat().st_mtime for entry in os.scandir(directory)), default=0)
+            shards.append((written, int(name)))
+    guild_ids = [guild_id for _, guild_id in sorted(shards, reverse=True)]
+    if LEGACY_GUILD_ID and int(LEGACY_GUILD_ID) not in guild_ids and legacy_files():
+        guild_ids.insert(0, int(LEGACY_GUILD_ID))
+    return guild_ids
+
+def shutdown():
+    """Stop the shared worker once every shard has been closed"""
+    _executor.shutdown(wait=True)
+
+
+# ---------------- Persistence Service ---------------- #
+class PersistenceService:
+    """Collects changed entries and writes them to one shard's journal (or SQLite) off the event loop.
+
+    Commands call record() after mutating state, and append_event() for
+    match results. Changes are coalesced for FLUSH_DELAY seconds and then
+    serialized and appended on the shared worker thread, so the event loop
+    never waits on json.dump or the disk.
+    """
+
+    def __init__(self, directory: str, delay: float = FLUSH_DELAY):
+        self.directory = directory
+        self.data_file = os.path.join(directory, DATA_FILE)
+        self.snapshot_file = os.path.join(directory, SNAPSHOT_FILE)
+        self.journal_file = os.path.join(directory, JOURNAL_FILE)
+        self.old_journal_file = os.path.join(directory, OLD_JOURNAL_FILE)
+        self.match_log_file = os.path.join(directory, MATCH_LOG_FILE)
+        self.delay = delay
+        self.tables = {}
+        self.encoders = {}
+        self.dirty = False
+        self._pending = {}
+        self._events = []
+        self._flush_task = None
+        self._journal_size = os.path.getsize(self.journal_file) if os.path.exists(self.journal_file) else 0
+        self.store = self._open_store()
+
+    def _open_store(self):
+        """Open the SQLite store when that backend is selected, migrating stats.json on first use"""
+        if STORAGE_BACKEND != "sqlite":
+            return None
+        from sqlite_store import SqliteStore
+
+        sqlite = SqliteStore(os.path.join(self.directory, DATABASE_FILE))
+        if sqlite.is_empty() and (os.path.exists(self.snapshot_file) or os.path.exists(self.data_file)):
+            sqlite.import_data(state_to_data(*self._read_files()))
+        if sqlite.match_count() == 0 and os.path.exists(self.match_log_file):
+            sqlite.append_matches(list(read_match_log(self.match_log_file)))
+        return sqlite
+
+    def load_state(self):
+        """(PlayerStore, teams dict with member lists) as last written"""
+        if self.store is not None:
+            data = self.store.load()
+            return PlayerStore.from_data(data["players"], data["training_levels"]), data["TEAMS"]
+        return self._read_files()
+
+    def _read_snapshot(self):
+        if os.path.exists(self.snapshot_file):
+            return read_snapshot(self.snapshot_file)
+        if os.path.exists(self.data_file):
+            with open(self.data_file, "r") as f:
+                data = json.load(f)
+            return PlayerStore.from_data(data.get("players", {}), data.get("training_levels", {})), data.get("TEAMS", {})
+        return PlayerStore(), {}
+
+    def _read_files(self):
+        players, teams = self._read_snapshot()
+        # A leftover .old journal means a compaction never finished, so it goes first
+        apply_journal(players, teams, self.old_journal_file)
+        apply_journal(players, teams, self.journal_file)
+        return players, teams
+
+    def match_totals(self):
+        """(highest match id, number of matches) without reading the whole history.
+
+        Ids are handed out one by one from 1 and events are never removed,
+        so for the JSON log the last id doubles as the count.
+        """
+        if self.store is not None:
+            return self.store.match_totals()
+        event = read_last_match(self.match_log_file)
+        last_id = event["id"] if event is not None else 0
+        return last_id, last_id
+
+    def load_matches(self):
+        """Every recorded match event, oldest first"""
+        if self.store is not None:
+            return self.store.matches()
+        return list(read_match_log(self.match_log_file))
+
+    def bind(self, tables: dict, encoders: dict = None):
+        """Register the live dicts, keyed by their name in stats.json.
+
+        encoders maps a table name to a function that returns a detached,
+        JSON-ready copy of one value; other tables are deep-copied.
+        """
+        self.tables = tables
+        self.encoders = encoders or {}
+
+    def record(self, table: str, key: str):
+        """Mark one entry as changed and schedule a coalesced write"""
+        self._pending[(table, key)] = None
+        self._schedule()
+
+    def append_event(self, event: dict):
+        """Queue a match event; it is written together with the totals it changed"""
+        self._events.append(event)
+        self._schedule()
+
+    def _schedule(self):
+        self.dirty = True
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # No loop (scripts, migrations): write straight away
+            self._write(*self._take_pending())
+            return
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = loop.create_task(self._delayed_flush())
+
+    async def _delayed_flush(self):
+        # Changes recorded while a write is running find this task still alive and
+        # don't start another, so keep going until nothing is left
+        while self.dirty:
+            await asyncio.sleep(self.delay)
+            await self.flush()
+
+    def _take_pending(self):
+        entries = []
+        for table, key in self._pending:
+            source = self.tables[table]
+            entry = {"table": table, "key": key}
+            if key in source:
+                # Copy now so the worker thread never sees a half-edited record
+                encode = self.encoders.get(table, copy.deepcopy)
+                entry["value"] = encode(source[key])
+            else:
+                entry["deleted"] = True
+            entries.append(entry)
+        events, self._events = self._events, []
+        self._pending.clear()
+        self.dirty = False
+        return entries, events
+
+    async def flush(self):
+        """Write all pending changes now; does nothing when nothing changed"""
+        if not self.dirty:
+            return
+        entries, events = self._take_pending()
+        loop = asyncio.get_running_loop()
+        with metrics.io("persistence_flush"):
+            await loop.run_in_executor(_executor, self._write, entries, events)
+
+    async def query(self, fn, *args):
+        """Run a store query on the worker thread after pending writes have landed"""
+        await self.flush()
+        loop = asyncio.get_running_loop()
+        with metrics.io("persistence_query"):
+            return await loop.run_in_executor(_executor, fn, *args)
+
+    async def close(self):
+        """Flush outstanding changes and release the shard's store"""
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+        await self.flush()
+        if self.store is not None:
+            await asyncio.get_running_loop().run_in_executor(_executor, self.store.close)
+
+    # -------- worker thread -------- #
+    def _write(self, entries, events=()):
+        with metrics.timer("persistence_write"):
+            self._write_entries(entries, events)
+        if self._journal_size > JOURNAL_MAX_BYTES:
+            with metrics.timer("persistence_compact"):
+                self._compact()
+
+    def _write_entries(self, entries, events):
+        if self.store is not None:
+            self.store.apply(entries, events)
+            return
+        if events:
+            # Events land first: a crash in between leaves history intact, only the totals lag
+            with open(self.match_log_file, "a") as f:
+                f.write("".join(json.dumps(event) + "\n" for event in events))
+                f.flush()
+                os.fsync(f.fileno())
+        if not entries:
+            return
+        lines = "".join(json.dumps(entry) + "\n" for entry in entries)
+        with open(self.journal_file, "a") as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        self._journal_size += len(lines)
+
+    def _compact(self):
+        """Fold the journal into a new snapshot without touching live state"""
+        if os.path.exists(self.old_journal_file):
+            with open(self.journal_file, "r") as src, open(self.old_journal_file, "a") as dst:
+                dst.write(src.read())
+            os.remove(self.journal_file)
+        else:
+            os.replace(self.journal_file, self.old_journal_file)
+        self._journal_size = 0
+        players, teams = self._read_snapshot()
+        apply_journal(players, teams, self.old_journal_file)
+        if SNAPSHOT_FORMAT == "json":
+            write_atomic(self.data_file, json.dumps(state_to_data(players, teams), indent=4))
+            if os.path.exists(self.snapshot_file):
+                os.remove(self.snapshot_file)
+        else:
+            write_atomic(self.snapshot_file, encode_snapshot(players, teams))
+            if os.path.exists(self.data_file):
+                os.remove(self.data_file)
+        os.remove(self.old_journal_file)
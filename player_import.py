@@ -0,0 +1,67 @@
+import csv
+import io
+import json
+
+
+_COLUMNS = ("username", "level", "team")
+
+
+def parse_player_rows(filename: str, data: bytes):
+    """Parse a CSV or JSON upload of username/level/team rows.
+
+    CSV may have a header naming its columns (any order) or be plain
+    `username,level,team` rows; JSON is a list of objects, optionally under a
+    "players" key. Level and team may be blank. Returns (rows, errors) where
+    each row is (row number, username, level or None, team or None).
+    """
+    text = data.decode("utf-8-sig", errors="replace")
+    if filename.lower().endswith(".json"):
+        return _parse_json(text)
+    return _parse_csv(text)
+
+
+def _clean(value):
+    if value is None:
+        return None
+    return str(value).strip() or None
+
+
+def _parse_csv(text: str):
+    rows, errors = [], []
+    reader = csv.reader(io.StringIO(text))
+    columns = _COLUMNS
+    for row_no, cells in enumerate(reader, 1):
+        if not any(cell.strip() for cell in cells):
+            continue
+        if row_no == 1 and cells[0].strip().lower() in _COLUMNS:
+            columns = tuple(cell.strip().lower() for cell in cells)
+            continue
+        values = dict(zip(columns, cells))
+        username = _clean(values.get("username"))
+        if username is None:
+            errors.append(f"Row {row_no}: missing username")
+            continue
+        rows.append((row_no, username, _clean(values.get("level")), _clean(values.get("team"))))
+    return rows, errors
+
+
+def _parse_json(text: str):
+    rows, errors = [], []
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError as e:
+        return [], [f"Invalid JSON: {e}"]
+    if isinstance(data, dict):
+        data = data.get("players", [])
+    if not isinstance(data, list):
+        return [], ["JSON must be a list of players"]
+    for row_no, item in enumerate(data, 1):
+        if not isinstance(item, dict):
+            errors.append(f"Row {row_no}: expected an object")
+            continue
+        username = _clean(item.get("username"))
+        if username is None:
+            errors.append(f"Row {row_no}: missing username")
+            continue
+        rows.append((row_no, username, _clean(item.get("level")), _clean(item.get("team"))))
+    return rows, errors
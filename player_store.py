@@ -0,0 +1,341 @@
+from array import array
+
+try:
+    import numpy as np
+except ImportError:  # optional: the pure-Python paths below give the same answers, just slower
+    np = None
+
+from ratings import RATING_RD_START, RATING_START, skill
+
+
+TRAINING_ROLES = ["Apprentice", "Wizard", "Sage"]
+# Largest win/loss count an array('I') column holds
+COUNT_MAX = 2 ** 32 - 1
+
+
+def clamp_count(value) -> int:
+    """A stored win/loss count squeezed into the column's range (older files may hold negatives)"""
+    return min(max(int(value), 0), COUNT_MAX)
+
+
+def win_rate(wins: int, losses: int) -> float:
+    total = wins + losses
+    return (wins / total) * 100 if total > 0 else 0.0
+
+
+#---------------------------Player Class--------------------------------#
+class Player:
+    """One player's record, read and written straight through to its PlayerStore row"""
+
+    __slots__ = ("id", "_store")
+
+    def __init__(self, store, player_id: str):
+        self.id = player_id
+        self._store = store
+
+    @property
+    def _row(self):
+        return self._store.rows[self.id]
+
+    @property
+    def username(self):
+        return self._store.usernames[self._row]
+
+    @username.setter
+    def username(self, value: str):
+        self._store.usernames[self._row] = value
+
+    @property
+    def wins(self):
+        return self._store.wins[self._row]
+
+    @wins.setter
+    def wins(self, value: int):
+        self._store.wins[self._row] = value
+
+    @property
+    def losses(self):
+        return self._store.losses[self._row]
+
+    @losses.setter
+    def losses(self, value: int):
+        self._store.losses[self._row] = value
+
+    @property
+    def level(self):
+        return self._store.levels[self._row]
+
+    @level.setter
+    def level(self, value: int):
+        self._store.levels[self._row] = value
+
+    @property
+    def team(self):
+        return self._store.teams[self._row]
+
+    @team.setter
+    def team(self, value):
+        self._store.teams[self._row] = value
+
+    @property
+    def rating(self):
+        return self._store.ratings[self._row]
+
+    @rating.setter
+    def rating(self, value: float):
+        self._store.ratings[self._row] = value
+
+    @property
+    def rd(self):
+        return self._store.rds[self._row]
+
+    @rd.setter
+    def rd(self, value: float):
+        self._store.rds[self._row] = value
+
+    @property
+    def skill(self):
+        return skill(self.rating, self.rd)
+
+    @property
+    def training_role(self):
+        return TRAINING_ROLES[self.level]
+
+    def win_percent(self):
+        return win_rate(self.wins, self.losses)
+
+    def record_win(self):
+        self.wins += 1
+
+    def record_loss(self):
+        self.losses += 1
+
+    def to_dict(self):
+        """The stats.json form of this record"""
+        return {
+            "username": self.username,
+            "wins": self.wins,
+            "losses": self.losses,
+            "team": self.team,
+            "rating": round(self.rating, 2),
+            "rd": round(self.rd, 2)
+        }
+
+    def __repr__(self):
+        return f"<Player {self.username}: {self.wins}-{self.losses}, {self.win_percent():.1f}% WR>"
+
+
+#---------------------------Player Store--------------------------------#
+class PlayerStore:
+    """Columnar player storage behind dict-style access by player id.
+
+    wins, losses and levels are contiguous array('I') columns, ratings and
+    rds array('d') columns, and usernames / teams are parallel lists, with `rows` mapping id -> row. Deleting moves
+    the last row into the hole, so columns stay dense. League-wide math
+    (win rates, skills, per-team totals) runs over whole columns, with
+    NumPy when it is installed.
+    """
+
+    def __init__(self):
+        self.rows = {}        # id -> row, in insertion order
+        self.ids = []         # row -> id
+        self.usernames = []
+        self.teams = []
+        self.wins = array("I")
+        self.losses = array("I")
+        self.levels = array("I")
+        self.ratings = array("d")
+        self.rds = array("d")
+        self._players = {}    # id -> Player view, created on first access
+
+    @classmethod
+    def from_data(cls, players: dict, training_levels: dict):
+        """Build from the stats.json "players" and "training_levels" sections"""
+        store = cls()
+        for player_id, record in players.items():
+            store.put(player_id, record, training_levels.get(player_id, 0))
+        return store
+
+    @classmethod
+    def from_columns(cls, ids, usernames, teams, wins, losses, levels, ratings, rds):
+        """Adopt ready-made columns (from a binary snapshot) without touching rows one by one"""
+        store = cls()
+        store.rows = dict(zip(ids, range(len(ids))))
+        store.ids = ids
+        store.usernames = usernames
+        store.teams = teams
+        store.wins, store.losses, store.levels = wins, losses, levels
+        store.ratings, store.rds = ratings, rds
+        return store
+
+    def put(self, player_id: str, record: dict, level: int = 0):
+        """Insert or reset a player from its stats.json record"""
+        return self.add(
+            player_id,
+            record["username"],
+            wins=record.get("wins", 0),
+            losses=record.get("losses", 0),
+            team=record.get("team"),
+            level=level,
+            rating=record.get("rating", RATING_START),
+            rd=record.get("rd", RATING_RD_START)
+        )
+
+    def add(self, player_id: str, username: str, wins: int = 0, losses: int = 0, team=None, level: int = 0,
+            rating: float = RATING_START, rd: float = RATING_RD_START):
+        """Insert a player, or reset the existing record with the same id"""
+        wins, losses = clamp_count(wins), clamp_count(losses)
+        row = self.rows.get(player_id)
+        if row is None:
+            row = len(self.ids)
+            self.rows[player_id] = row
+            self.ids.append(player_id)
+            self.usernames.append(username)
+            self.teams.append(team)
+            self.wins.append(wins)
+            self.losses.append(losses)
+            self.levels.append(level)
+            self.ratings.append(rating)
+            self.rds.append(rd)
+        else:
+            self.usernames[row] = username
+            self.teams[row] = team
+            self.wins[row] = wins
+            self.losses[row] = losses
+            self.levels[row] = level
+            self.ratings[row] = rating
+            self.rds[row] = rd
+        return self[player_id]
+
+    def pop(self, player_id: str, default=None):
+        row = self.rows.pop(player_id, None)
+        if row is None:
+            return default
+        removed = self._players.pop(player_id, None)
+        last = len(self.ids) - 1
+        if row != last:
+            # Move the last row into the hole
+            moved = self.ids[last]
+            self.rows[moved] = row
+            self.ids[row] = moved
+            for column in self._columns():
+                column[row] = column[last]
+        for column in (self.ids,) + self._columns():
+            column.pop()
+        return removed
+
+    def _columns(self):
+        return (self.usernames, self.teams, self.wins, self.losses, self.levels, self.ratings, self.rds)
+
+    # -------- dict-style access -------- #
+    def __getitem__(self, player_id: str) -> Player:
+        player = self._players.get(player_id)
+        if player is None:
+            if player_id not in self.rows:
+                raise KeyError(player_id)
+            player = self._players[player_id] = Player(self, player_id)
+        return player
+
+    def get(self, player_id: str, default=None):
+        return self[player_id] if player_id in self.rows else default
+
+    def __contains__(self, player_id):
+        return player_id in self.rows
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def items(self):
+        return ((player_id, self[player_id]) for player_id in self.rows)
+
+    def values(self):
+        return (self[player_id] for player_id in self.rows)
+
+    @property
+    def training_levels(self):
+        """The level column as a {player id: level} mapping, for the training_levels table"""
+        return LevelView(self)
+
+    # -------- column math -------- #
+    def win_rates(self):
+        """Win rate of every row, in row order"""
+        if np is not None:
+            wins = np.frombuffer(self.wins, dtype=np.uint32).astype(np.float64)
+            total = wins + np.frombuffer(self.losses, dtype=np.uint32)
+            rates = np.zeros_like(wins)
+            np.divide(wins * 100, total, out=rates, where=total > 0)
+            return rates
+        return [win_rate(w, l) for w, l in zip(self.wins, self.losses)]
+
+    def ranking_entries(self):
+        """(id, win rate, username, team) for every row, for bulk-building a Leaderboard"""
+        return zip(self.ids, (float(rate) for rate in self.win_rates()), self.usernames, self.teams)
+
+    def skills(self):
+        """Conservative rating (rating - 2 RD) of every row, in row order"""
+        if np is not None:
+            return np.frombuffer(self.ratings) - 2 * np.frombuffer(self.rds)
+        return [skill(rating, rd) for rating, rd in zip(self.ratings, self.rds)]
+
+    def rating_entries(self):
+        """(id, skill, username, team) for every row, for bulk-building the rating Leaderboard"""
+        return zip(self.ids, (float(value) for value in self.skills()), self.usernames, self.teams)
+
+    def team_aggregates(self):
+        """{team: (members, wins, losses, average member win rate)} in one pass over the columns"""
+        if not self.ids:
+            return {}
+        rates = self.win_rates()
+        if np is not None:
+            names = [team if team is not None else "" for team in self.teams]
+            keys, codes = np.unique(np.array(names, dtype=object), return_inverse=True)
+            counts = np.bincount(codes)
+            wins = np.bincount(codes, weights=np.frombuffer(self.wins, dtype=np.uint32))
+            losses = np.bincount(codes, weights=np.frombuffer(self.losses, dtype=np.uint32))
+            rate_sums = np.bincount(codes, weights=rates)
+            return {
+                key: (int(counts[i]), int(wins[i]), int(losses[i]), float(rate_sums[i] / counts[i]))
+                for i, key in enumerate(keys) if key != ""
+            }
+        totals = {}
+        for team, w, l, rate in zip(self.teams, self.wins, self.losses, rates):
+            if team is None:
+                continue
+            count, wins, losses, rate_sum = totals.get(team, (0, 0, 0, 0.0))
+            totals[team] = (count + 1, wins + w, losses + l, rate_sum + rate)
+        return {
+            team: (count, wins, losses, rate_sum / count)
+            for team, (count, wins, losses, rate_sum) in totals.items()
+        }
+
+
+class LevelView:
+    """Dict-style view of a PlayerStore's level column"""
+
+    def __init__(self, store: PlayerStore):
+        self._store = store
+
+    def __getitem__(self, player_id: str) -> int:
+        return self._store.levels[self._store.rows[player_id]]
+
+    def __setitem__(self, player_id: str, level: int):
+        self._store.levels[self._store.rows[player_id]] = level
+
+    def get(self, player_id: str, default=None):
+        row = self._store.rows.get(player_id)
+        return default if row is None else self._store.levels[row]
+
+    def __contains__(self, player_id):
+        return player_id in self._store.rows
+
+    def __len__(self):
+        return len(self._store)
+
+    def __iter__(self):
+        return iter(self._store.rows)
+
+    def items(self):
+        return ((player_id, self[player_id]) for player_id in self._store.rows)
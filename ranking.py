@@ -0,0 +1,96 @@
+import bisect
+
+
+# ---------------- Leaderboard ---------------- #
+class Leaderboard:
+    """Players kept sorted by (score desc, username), league-wide and per team.
+
+    The score is whatever the board ranks by: win rate or rating skill.
+
+    Each ordering is a plain list kept sorted with bisect, so an update is two
+    O(log n) searches plus a list shift, and top-N / rank lookups never need a
+    full pass or re-sort.
+    """
+
+    def __init__(self):
+        self._keys = {}      # id -> sort key currently stored
+        self._teams = {}     # id -> team the player is ranked under
+        self._league = []
+        self._by_team = {}   # team -> sorted keys
+
+    @staticmethod
+    def _key(player_id: str, score: float, username: str):
+        return (-score, username.lower(), player_id)
+
+    def __len__(self):
+        return len(self._league)
+
+    def __contains__(self, player_id):
+        return player_id in self._keys
+
+    def rebuild(self, entries):
+        """Replace everything from (id, score, username, team) entries with one sort"""
+        self._keys.clear()
+        self._teams.clear()
+        self._by_team.clear()
+        for player_id, score, username, team in entries:
+            key = self._key(player_id, score, username)
+            self._keys[player_id] = key
+            self._teams[player_id] = team
+            if team is not None:
+                self._by_team.setdefault(team, []).append(key)
+        self._league = sorted(self._keys.values())
+        for ranked in self._by_team.values():
+            ranked.sort()
+
+    def update(self, player_id: str, score: float, username: str, team=None):
+        """Insert or move a player after their record, name or team changed"""
+        key = self._key(player_id, score, username)
+        if self._keys.get(player_id) == key and self._teams.get(player_id) == team:
+            return
+        self.remove(player_id)
+        self._keys[player_id] = key
+        self._teams[player_id] = team
+        bisect.insort(self._league, key)
+        if team is not None:
+            bisect.insort(self._by_team.setdefault(team, []), key)
+
+    def remove(self, player_id: str):
+        key = self._keys.pop(player_id, None)
+        if key is None:
+            return
+        team = self._teams.pop(player_id)
+        _discard(self._league, key)
+        if team is not None:
+            ranked = self._by_team[team]
+            _discard(ranked, key)
+            if not ranked:
+                del self._by_team[team]
+
+    def drop_team(self, team: str):
+        """Forget a team's sub-ranking; its players stay in the league ranking"""
+        for key in self._by_team.pop(team, []):
+            self._teams[key[2]] = None
+
+    def top(self, n: int = None, team: str = None, offset: int = 0):
+        """Ids of the best n players after skipping offset (all of them when n is None)"""
+        ranked = self._league if team is None else self._by_team.get(team, [])
+        end = None if n is None else offset + n
+        return [key[2] for key in ranked[offset:end]]
+
+    def rank(self, player_id: str, team: str = None):
+        """1-based position of a player, or None if they are not ranked there"""
+        key = self._keys.get(player_id)
+        if key is None:
+            return None
+        ranked = self._league if team is None else self._by_team.get(team, [])
+        i = bisect.bisect_left(ranked, key)
+        if i < len(ranked) and ranked[i] == key:
+            return i + 1
+        return None
+
+
+def _discard(ranked, key):
+    i = bisect.bisect_left(ranked, key)
+    if i < len(ranked) and ranked[i] == key:
+        del ranked[i]
@@ -0,0 +1,71 @@
+import math
+import os
+
+
+# ---------------- Settings ---------------- #
+# Glicko-1 style: every player has a rating and a rating deviation (RD, the
+# uncertainty). Changing these only affects new results until the ratings
+# are rebuilt from the match history.
+RATING_START = float(os.getenv("RATING_START", "1500"))
+RATING_RD_START = float(os.getenv("RATING_RD_START", "350"))
+# RD never shrinks below this, so established ratings can still move
+RATING_RD_MIN = float(os.getenv("RATING_RD_MIN", "50"))
+
+_Q = math.log(10) / 400
+
+
+def skill(rating: float, rd: float) -> float:
+    """Conservative estimate used for sorting: a 1-0 newcomer stays below a proven veteran"""
+    return rating - 2 * rd
+
+def _g(rd: float) -> float:
+    return 1 / math.sqrt(1 + 3 * _Q * _Q * rd * rd / (math.pi * math.pi))
+
+def _composite(side):
+    """One (rating, rd) standing in for a whole side; an empty side is an unknown newcomer"""
+    if not side:
+        return RATING_START, RATING_RD_START
+    rating = sum(r for r, _ in side) / len(side)
+    rd = math.sqrt(sum(d * d for _, d in side) / len(side))
+    return rating, rd
+
+def _update(rating: float, rd: float, opponent, score: float):
+    opp_rating, opp_rd = opponent
+    g = _g(opp_rd)
+    expected = 1 / (1 + 10 ** (-g * (rating - opp_rating) / 400))
+    d2_inv = _Q * _Q * g * g * expected * (1 - expected)
+    denom = 1 / (rd * rd) + d2_inv
+    new_rating = rating + _Q / denom * g * (score - expected)
+    new_rd = max(RATING_RD_MIN, math.sqrt(1 / denom))
+    return new_rating, new_rd
+
+
+def rate_match(winners, losers):
+    """New (rating, rd) for both sides of one result.
+
+    winners and losers are lists of (rating, rd). Each player is rated
+    against the other side's composite, so a result costs O(participants).
+    """
+    winner_side = _composite(winners)
+    loser_side = _composite(losers)
+    return (
+        [_update(rating, rd, loser_side, 1.0) for rating, rd in winners],
+        [_update(rating, rd, winner_side, 0.0) for rating, rd in losers]
+    )
+
+
+def replay(events):
+    """Rebuild every rating from scratch by replaying match events in order.
+
+    Pure and self-contained so it can run in a worker thread or process.
+    Returns {player id: (rating, rd)} for everyone who played.
+    """
+    ratings = {}
+    start = (RATING_START, RATING_RD_START)
+    for event in events:
+        winners = [ratings.get(player_id, start) for player_id in event["winners"]]
+        losers = [ratings.get(player_id, start) for player_id in event["losers"]]
+        new_winners, new_losers = rate_match(winners, losers)
+        ratings.update(zip(event["winners"], new_winners))
+        ratings.update(zip(event["losers"], new_losers))
+    return ratings
@@ -0,0 +1,44 @@
+import os
+from collections import OrderedDict
+
+from metrics import metrics
+
+
+# Rendered embeds kept per loaded guild
+RENDER_CACHE_SIZE = int(os.getenv("RENDER_CACHE_SIZE", "128"))
+
+
+# ---------------- Render Cache ---------------- #
+class RenderCache:
+    """Rendered embeds keyed by (command, args..., data version), least recently used dropped first.
+
+    The league's version goes up with every change, so an entry can never
+    be served after the data it shows has changed; entries for old
+    versions simply age out. Cached embeds are shared, so callers must not
+    modify what they get back.
+    """
+
+    def __init__(self, size: int = RENDER_CACHE_SIZE):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    async def get(self, key, render):
+        """The cached embed for key, or await render() and cache its result"""
+        embed = self._entries.get(key)
+        if embed is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            metrics.increment("render_cache_hits")
+            return embed
+        self.misses += 1
+        metrics.increment("render_cache_misses")
+        embed = await render()
+        self._entries[key] = embed
+        if len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+        return embed
@@ -0,0 +1,95 @@
+import asyncio
+import os
+
+
+# Role edits sent per second, spaced out to stay clear of Discord's member-edit rate limit
+ROLE_UPDATES_PER_SECOND = float(os.getenv("ROLE_UPDATES_PER_SECOND", "2"))
+
+
+# ---------------- Role Cache ---------------- #
+class RoleCache:
+    """(guild, role name) -> Role, so lookups don't walk guild.roles.
+
+    A guild's map is built on first use and dropped whenever one of its roles
+    is created, updated or deleted.
+    """
+
+    def __init__(self):
+        self._guilds = {}
+
+    def get(self, guild, name: str):
+        roles = self._guilds.get(guild.id)
+        if roles is None:
+            roles = {}
+            for role in guild.roles:
+                # Keep the first match, like discord.utils.get
+                roles.setdefault(role.name, role)
+            self._guilds[guild.id] = roles
+        return roles.get(name)
+
+    def invalidate(self, guild_id: int):
+        self._guilds.pop(guild_id, None)
+
+
+# ---------------- Role Pipeline ---------------- #
+class RolePipeline:
+    """Queues role additions and sends one add_roles call per member.
+
+    Requests for the same member that are still waiting are merged, roles the
+    member already has are skipped, and calls are spaced to stay under
+    ROLE_UPDATES_PER_SECOND. Discord limits member edits per guild, so each
+    guild has its own queue and pacing: a big import in one server never
+    delays another's. Awaiting add_roles() returns once the merged call for
+    that member has gone through (or raises its error).
+    """
+
+    def __init__(self, rate: float = ROLE_UPDATES_PER_SECOND):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._pending = {}   # guild id -> {member id -> [member, roles dict, futures, reason]}
+        self._workers = {}   # guild id -> task draining that guild's queue
+        self._next_at = {}   # guild id -> loop time its next call may go out
+
+    async def add_roles(self, member, *roles, reason: str = None):
+        roles = [role for role in roles if role is not None]
+        if not roles:
+            return
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        guild_id = member.guild.id
+        queue = self._pending.setdefault(guild_id, {})
+        entry = queue.get(member.id)
+        if entry is None:
+            entry = queue[member.id] = [member, {}, [], reason]
+        for role in roles:
+            entry[1][role.id] = role
+        entry[2].append(future)
+        worker = self._workers.get(guild_id)
+        if worker is None or worker.done():
+            self._workers[guild_id] = loop.create_task(self._drain(guild_id))
+        await future
+
+    async def _drain(self, guild_id: int):
+        loop = asyncio.get_running_loop()
+        queue = self._pending[guild_id]
+        while queue:
+            member, roles, futures, reason = queue.pop(next(iter(queue)))
+            have = {role.id for role in member.roles}
+            missing = [role for role_id, role in roles.items() if role_id not in have]
+            try:
+                if missing:
+                    delay = self._next_at.get(guild_id, 0.0) - loop.time()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    self._next_at[guild_id] = loop.time() + self.interval
+                    await member.add_roles(*missing, reason=reason)
+            except Exception as e:  # usually discord.HTTPException / Forbidden
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                for future in futures:
+                    if not future.done():
+                        future.set_result(None)
+        # Only the pacing (one float) outlives the queue, so the next burst still waits its turn
+        del self._pending[guild_id]
+        self._workers.pop(guild_id, None)
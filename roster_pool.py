@@ -0,0 +1,60 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from roster_solver import ROSTER_TIME_BUDGET, solve_rosters
+
+
+# ---------------- Settings ---------------- #
+ROSTER_WORKERS = int(os.getenv("ROSTER_WORKERS", "2"))
+# Solves allowed to run at once for a single guild
+MAX_SOLVES_PER_GUILD = int(os.getenv("MAX_SOLVES_PER_GUILD", "1"))
+# Hard limit on waiting for a worker; the solver stops itself after ROSTER_TIME_BUDGET
+ROSTER_TIMEOUT = float(os.getenv("ROSTER_TIMEOUT", str(ROSTER_TIME_BUDGET + 10)))
+
+
+class RosterBusy(Exception):
+    """Raised when a guild already has MAX_SOLVES_PER_GUILD solves running"""
+
+
+_executor = None
+_guild_slots = {}
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        # spawn, not fork: the bot process has live threads and sockets that must not be copied
+        _executor = ProcessPoolExecutor(
+            max_workers=ROSTER_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _executor
+
+async def solve_in_pool(guild_id: int, players, time_budget: float = ROSTER_TIME_BUDGET, timeout: float = ROSTER_TIMEOUT):
+    """Run solve_rosters in a worker process.
+
+    players is the solver's plain input ({"id", "skill", "max_games", "away"}
+    dicts), so it pickles cheaply. Raises RosterBusy when the guild is at its
+    limit and asyncio.TimeoutError when the worker takes longer than timeout.
+    Cancelling the awaiting task drops the result; a solve that has not
+    started yet is removed from the queue.
+    """
+    active = _guild_slots.get(guild_id, 0)
+    if active >= MAX_SOLVES_PER_GUILD:
+        raise RosterBusy()
+    _guild_slots[guild_id] = active + 1
+    try:
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(_get_executor(), solve_rosters, players, time_budget)
+        return await asyncio.wait_for(future, timeout)
+    finally:
+        _guild_slots[guild_id] -= 1
+        if not _guild_slots[guild_id]:
+            del _guild_slots[guild_id]
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -0,0 +1,343 @@
+import os
+import random
+import time
+from itertools import combinations
+
+
+# ---------------- Settings ---------------- #
+GAMES_3V3 = 4
+GAMES_2V2 = 8
+# Seconds the exact search may run before it settles for the best lineup found so far
+ROSTER_TIME_BUDGET = float(os.getenv("ROSTER_TIME_BUDGET", "2.0"))
+# Above this many candidate lineups the pool is too large to search; use the greedy pass
+MAX_CANDIDATES = int(os.getenv("ROSTER_MAX_CANDIDATES", "50000"))
+# How close to the best possible balance counts as done, as a fraction of the
+# pool's skill standard deviation (per-lineup RMS); 0 searches for the exact optimum
+ROSTER_TOLERANCE = float(os.getenv("ROSTER_TOLERANCE", "0.05"))
+# Random restarts of the local search (two swaps, then polish) before the exact search starts
+ROSTER_RESTARTS = int(os.getenv("ROSTER_RESTARTS", "50"))
+
+
+# Every solver takes a list of plain dicts {"id", "skill", "max_games"}, where
+# skill is any higher-is-stronger number (win rate or rating),
+# and returns a plain dict so results can cross process boundaries:
+#   {"3v3": [[id, id, id], ...], "2v2": [[id, id], ...],
+#    "assigned": {id: games}, "method": "optimal" | "time-limited" | "greedy"}
+
+def _result(players, rosters_3v3, rosters_2v2, method):
+    assigned = {p["id"]: 0 for p in players}
+    for team in rosters_3v3 + rosters_2v2:
+        for player_id in team:
+            assigned[player_id] += 1
+    return {"3v3": rosters_3v3, "2v2": rosters_2v2, "assigned": assigned, "method": method}
+
+
+# ---------------- Greedy ---------------- #
+def greedy_rosters(players):
+    """The original strong/medium/weak tier scan; fast, but can miss feasible or better fills"""
+    available_players = sorted(
+        (dict(p, games_assigned=0) for p in players if p["max_games"] > 0),
+        key=lambda x: x["skill"],
+        reverse=True
+    )
+
+    def has_games(player, used_ids):
+        return player["id"] not in used_ids and player["games_assigned"] < player["max_games"]
+
+    def pick(candidates, team, used_ids):
+        for player in candidates:
+            if has_games(player, used_ids):
+                team.append(player["id"])
+                player["games_assigned"] += 1
+                used_ids.add(player["id"])
+                return
+
+    def fill(team, used_ids, size):
+        # If we couldn't get balanced team, fill with anyone available
+        while len(team) < size:
+            before = len(team)
+            pick(available_players, team, used_ids)
+            if len(team) == before:
+                break
+
+    n = len(available_players)
+
+    # 3v3 first (higher priority): 1 strong + 1 medium + 1 weak
+    rosters_3v3 = []
+    for _ in range(GAMES_3V3):
+        team, used_ids = [], set()
+        pick(available_players[:n // 3 + 1], team, used_ids)
+        pick(available_players[n // 3:2 * n // 3 + 1], team, used_ids)
+        pick(reversed(available_players), team, used_ids)
+        fill(team, used_ids, 3)
+        if len(team) < 3:
+            break  # Can't fill more 3v3 games
+        rosters_3v3.append(team)
+
+    # 2v2: 1 strong + 1 weak
+    rosters_2v2 = []
+    for _ in range(GAMES_2V2):
+        team, used_ids = [], set()
+        pick(available_players[:n // 2 + 1], team, used_ids)
+        pick(reversed(available_players), team, used_ids)
+        fill(team, used_ids, 2)
+        if len(team) < 2:
+            break  # Can't fill more 2v2 games
+        rosters_2v2.append(team)
+
+    # Usage is counted from the kept lineups only, so abandoned partial lineups don't count
+    return _result(players, rosters_3v3, rosters_2v2, "greedy")
+
+
+# ---------------- Exact Solver ---------------- #
+def _fits(sizes, caps):
+    """Can games of these sizes (non-increasing) be filled with distinct players per game?
+
+    Gale-Ryser: for every k, the k largest games need at most
+    sum(min(cap, k)) player-slots.
+    """
+    needed = 0
+    for k, size in enumerate(sizes, 1):
+        needed += size
+        if needed > sum(cap if cap < k else k for cap in caps):
+            return False
+    return True
+
+def max_fillable(caps):
+    """(3v3 games, 2v2 games) that can be filled, preferring 3v3 games like the greedy pass"""
+    for k3 in range(GAMES_3V3, -1, -1):
+        if _fits([3] * k3, caps):
+            for k2 in range(GAMES_2V2, -1, -1):
+                if _fits([3] * k3 + [2] * k2, caps):
+                    return k3, k2
+    return 0, 0
+
+def _spread(strengths):
+    """Sum of squared deviations from the mean; variance times the number of games"""
+    if not strengths:
+        return 0.0
+    mean = sum(strengths) / len(strengths)
+    return sum((s - mean) ** 2 for s in strengths)
+
+def _mass_range(order, rates, caps, slots):
+    """(least, most) total skill `slots` player-games can add up to, each player used at most cap times"""
+    totals = []
+    for players in (order, reversed(order)):
+        left, total = slots, 0.0
+        for i in players:
+            take = min(caps[i], left)
+            total += take * rates[i]
+            left -= take
+            if not left:
+                break
+        totals.append(total)
+    return totals[0], totals[1]
+
+def _completion_bound(count, total, squares, weight, weight_sq, mass_lo, mass_hi):
+    """Least spread of `count` chosen strengths (sum total, sum of squares squares) plus the open games.
+
+    Each open game g of size w_g has strength x_g, and the skill of the
+    players still to be placed fixes sum(w_g * x_g) within [mass_lo,
+    mass_hi]. For a mean m the open games then cost at least
+    dist(m * weight, [mass_lo, mass_hi])^2 / weight_sq (weight = sum w_g,
+    weight_sq = sum w_g^2), a convex piecewise quadratic minimized here in
+    closed form. With little spare capacity the mass range is narrow, which
+    is exactly when the search needs the help.
+    """
+    def cost(m):
+        below, above = mass_lo - m * weight, m * weight - mass_hi
+        gap = below if below > 0 else above if above > 0 else 0.0
+        return squares - 2 * m * total + count * m * m + gap * gap / weight_sq
+
+    k = weight * weight / weight_sq
+    options = [(total + weight * mass_lo / weight_sq) / (count + k),
+               (total + weight * mass_hi / weight_sq) / (count + k)]
+    if count:
+        options.append(total / count)
+    return max(0.0, min(cost(m) for m in options))
+
+def _polish(games, rates, caps):
+    """Hill-climb a complete solution by swapping players between games or bringing in a player with games left.
+
+    Every move keeps each game's size and each player's cap, so the result
+    is still valid; it stops at the first solution no single move improves.
+    Returns (games as lists of pool indices, spread).
+    """
+    games = [list(game) for game in games]
+    uses = [0] * len(rates)
+    for game in games:
+        for i in game:
+            uses[i] += 1
+    strengths = [sum(rates[i] for i in game) / len(game) for game in games]
+    cost = _spread(strengths)
+    improved = True
+    while improved:
+        improved = False
+        for g, game in enumerate(games):
+            for slot in range(len(game)):
+                for c in range(len(rates)):
+                    a = game[slot]
+                    if uses[c] >= caps[c] or c in game:
+                        continue
+                    old = strengths[g]
+                    strengths[g] = old + (rates[c] - rates[a]) / len(game)
+                    new = _spread(strengths)
+                    if new < cost - 1e-12:
+                        game[slot] = c
+                        uses[c] += 1
+                        uses[a] -= 1
+                        cost, improved = new, True
+                    else:
+                        strengths[g] = old
+                for h in range(g + 1, len(games)):
+                    other = games[h]
+                    for other_slot in range(len(other)):
+                        a, b = game[slot], other[other_slot]
+                        if a in other or b in game:
+                            continue
+                        old_g, old_h = strengths[g], strengths[h]
+                        strengths[g] = old_g + (rates[b] - rates[a]) / len(game)
+                        strengths[h] = old_h + (rates[a] - rates[b]) / len(other)
+                        new = _spread(strengths)
+                        if new < cost - 1e-12:
+                            game[slot], other[other_slot] = b, a
+                            cost, improved = new, True
+                        else:
+                            strengths[g], strengths[h] = old_g, old_h
+    return games, cost
+
+def _kick(games, rng, swaps: int = 2):
+    """games with a few random player swaps between games (sizes and uses unchanged)"""
+    games = [list(game) for game in games]
+    for _ in range(swaps):
+        g, h = rng.sample(range(len(games)), 2)
+        a, b = rng.randrange(len(games[g])), rng.randrange(len(games[h]))
+        if games[g][a] not in games[h] and games[h][b] not in games[g]:
+            games[g][a], games[h][b] = games[h][b], games[g][a]
+    return games
+
+def solve_rosters(players, time_budget: float = ROSTER_TIME_BUDGET, tolerance: float = ROSTER_TOLERANCE):
+    """Fill as many games as possible and minimize the skill variance between lineups.
+
+    The greedy fill is polished by local search and then by random restarts
+    of it, which finds well balanced lineups within milliseconds. A
+    branch-and-bound over lineups, game by game, then improves on that or
+    proves nothing better is left. Games of the same size are
+    interchangeable, so lineups are only chosen in non-decreasing candidate
+    order. A branch is cut when the remaining games can no longer be filled,
+    or when a lower bound on its final spread (see _completion_bound) is
+    within `tolerance` of the best solution. The answer is then at most
+    `tolerance` from the optimum, and the search stops as soon as the lineups
+    are that close to perfectly even ("optimal"). When time runs out the
+    best solution so far is returned ("time-limited"), and the greedy pass
+    is the fallback.
+    """
+    greedy = greedy_rosters(players)
+    pool = [p for p in players if p["max_games"] > 0]
+    caps = [min(p["max_games"], GAMES_3V3 + GAMES_2V2) for p in pool]
+    limits = list(caps)   # caps is spent as the search goes down; polishing needs the full limits
+    rates = [p["skill"] for p in pool]
+    k3, k2 = max_fillable(caps)
+    sizes = [3] * k3 + [2] * k2
+    if not sizes:
+        return greedy
+
+    n = len(pool)
+    n_candidates = (n * (n - 1) * (n - 2) // 6 if k3 else 0) + (n * (n - 1) // 2 if k2 else 0)
+    if n_candidates > MAX_CANDIDATES:
+        return greedy
+
+    # Lineups closest to the pool's average strength are tried first so good
+    # solutions (and tight bounds) show up early
+    target = sum(r * c for r, c in zip(rates, caps)) / max(1, sum(caps))
+    candidates = {}
+    for size in set(sizes):
+        lineups = [(sum(rates[i] for i in combo) / size, combo) for combo in combinations(range(n), size)]
+        lineups.sort(key=lambda x: abs(x[0] - target))
+        candidates[size] = lineups
+
+    # Spread (sum of squares) the answer may be off by: tolerance is per-lineup RMS in pool standard deviations
+    slack = len(sizes) * (tolerance ** 2) * _spread(rates) / n
+    # Players weakest first, and per game the slots, sizes and squared sizes still open after it
+    by_skill = sorted(range(n), key=rates.__getitem__)
+    open_slots = [sum(sizes[game:]) for game in range(len(sizes) + 1)]
+    open_sq = [sum(size * size for size in sizes[game:]) for game in range(len(sizes) + 1)]
+
+    best_cost = float("inf")
+    best = None
+    if len(greedy["3v3"]) == k3 and len(greedy["2v2"]) == k2:
+        index_of = {p["id"]: i for i, p in enumerate(pool)}
+        best, best_cost = _polish([[index_of[player_id] for player_id in team]
+                                   for team in greedy["3v3"] + greedy["2v2"]], rates, limits)
+
+    deadline = time.monotonic() + time_budget
+    nodes = 0
+    timed_out = False
+    done = False
+    chosen = []
+    strengths = []
+    sums = [0.0, 0.0]   # sum and sum of squares of strengths
+
+    def search(game, start):
+        nonlocal best_cost, best, nodes, timed_out, done
+        if game == len(sizes):
+            cost = _spread(strengths)
+            if cost < best_cost:
+                # A polished incumbent prunes far more of what is left
+                best, best_cost = _polish(chosen, rates, limits)
+            # Balanced to within the tolerance of a perfect (zero) spread: nothing left to win
+            done = best_cost <= slack
+            return
+        size = sizes[game]
+        # Same-size games are interchangeable: don't revisit earlier candidates
+        first = start if game > 0 and sizes[game - 1] == size else 0
+        lineups = candidates[size]
+        for c in range(first, len(lineups)):
+            nodes += 1
+            if nodes & 255 == 0 and time.monotonic() > deadline:
+                timed_out = True
+            if timed_out or done:
+                return
+            strength, combo = lineups[c]
+            if any(caps[i] == 0 for i in combo):
+                continue
+            strengths.append(strength)
+            sums[0] += strength
+            sums[1] += strength * strength
+            if _spread(strengths) < best_cost - slack:
+                for i in combo:
+                    caps[i] -= 1
+                rest = game + 1
+                if rest == len(sizes):
+                    bound = 0.0
+                else:
+                    mass_lo, mass_hi = _mass_range(by_skill, rates, caps, open_slots[rest])
+                    bound = _completion_bound(len(strengths), sums[0], sums[1], open_slots[rest], open_sq[rest],
+                                              mass_lo, mass_hi)
+                if bound < best_cost - slack and _fits(sizes[rest:], caps):
+                    chosen.append(combo)
+                    search(rest, c)
+                    chosen.pop()
+                for i in combo:
+                    caps[i] += 1
+            sums[0] -= strength
+            sums[1] -= strength * strength
+            strengths.pop()
+
+    if best is not None and len(sizes) > 1:
+        # Iterated local search: cheap, and far better than plain search at finding balanced lineups
+        rng = random.Random(0)   # seeded, so the same availability always gives the same rosters
+        for _ in range(ROSTER_RESTARTS):
+            if best_cost <= slack or time.monotonic() > deadline:
+                break
+            games, cost = _polish(_kick(best, rng), rates, limits)
+            if cost < best_cost:
+                best, best_cost = games, cost
+
+    if best_cost > slack:
+        search(0, 0)
+
+    if best is None:
+        return greedy
+    lineups = [[pool[i]["id"] for i in combo] for combo in best]
+    return _result(players, lineups[:k3], lineups[k3:], "time-limited" if timed_out else "optimal")
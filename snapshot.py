@@ -0,0 +1,128 @@
+import mmap
+import struct
+import sys
+from array import array
+from itertools import accumulate
+
+from player_store import PlayerStore
+
+
+# ---------------- Format ---------------- #
+# A snapshot is the magic, a "<II" header (players, teams), then columns:
+#   players: ids, usernames, teams (strings), wins, losses, levels (uint32), ratings, rds (float64)
+#   teams:   names, roles (strings), wins, losses, member counts (uint32), member ids (strings)
+# Strings are stored as a uint32 array of character lengths, a uint32 byte
+# size and one UTF-8 blob, so a whole column decodes with a single
+# bytes.decode. Numbers are little-endian arrays copied straight into the
+# PlayerStore columns. No per-record parsing, and no pickle.
+MAGIC = b"LGSNAP1\n"
+_HEADER = struct.Struct("<II")
+_SIZE = struct.Struct("<I")
+_SWAP = sys.byteorder != "little"
+
+
+def _numbers(typecode: str, values):
+    column = array(typecode, values)
+    if _SWAP:
+        column.byteswap()
+    return column.tobytes()
+
+def _strings(values):
+    lengths = _numbers("I", (len(value) for value in values))
+    blob = "".join(values).encode("utf-8")
+    return lengths + _SIZE.pack(len(blob)) + blob
+
+
+def encode_snapshot(players: PlayerStore, teams: dict) -> bytes:
+    """Serialize a PlayerStore and a teams dict (members as lists or ordered dicts)"""
+    names = list(teams)
+    parts = [
+        MAGIC,
+        _HEADER.pack(len(players), len(names)),
+        _strings(players.ids),
+        _strings(players.usernames),
+        _strings([team or "" for team in players.teams]),
+        _numbers("I", players.wins),
+        _numbers("I", players.losses),
+        _numbers("I", players.levels),
+        _numbers("d", players.ratings),
+        _numbers("d", players.rds),
+        _strings(names),
+        _strings([teams[name].get("role") or "" for name in names]),
+        _numbers("I", (teams[name].get("wins", 0) for name in names)),
+        _numbers("I", (teams[name].get("losses", 0) for name in names)),
+        _numbers("I", (len(teams[name]["members"]) for name in names)),
+        _strings([member for name in names for member in teams[name]["members"]])
+    ]
+    return b"".join(parts)
+
+
+# ---------------- Reading ---------------- #
+class _Reader:
+    def __init__(self, buf):
+        self.buf = memoryview(buf)
+        self.pos = 0
+
+    def take(self, size: int):
+        chunk = self.buf[self.pos:self.pos + size]
+        if len(chunk) != size:
+            raise ValueError("snapshot is truncated")
+        self.pos += size
+        return chunk
+
+    def numbers(self, typecode: str, count: int):
+        column = array(typecode)
+        column.frombytes(self.take(count * column.itemsize))
+        if _SWAP:
+            column.byteswap()
+        return column
+
+    def strings(self, count: int):
+        lengths = self.numbers("I", count)
+        size, = _SIZE.unpack(self.take(_SIZE.size))
+        text = str(self.take(size), "utf-8")
+        bounds = list(accumulate(lengths, initial=0))
+        return [text[start:end] for start, end in zip(bounds, bounds[1:])]
+
+
+def decode_snapshot(buf):
+    """(PlayerStore, teams dict with member lists) from snapshot bytes"""
+    reader = _Reader(buf)
+    if bytes(reader.take(len(MAGIC))) != MAGIC:
+        raise ValueError("not a league snapshot")
+    n_players, n_teams = _HEADER.unpack(reader.take(_HEADER.size))
+
+    ids = reader.strings(n_players)
+    usernames = reader.strings(n_players)
+    player_teams = [team or None for team in reader.strings(n_players)]
+    players = PlayerStore.from_columns(
+        ids, usernames, player_teams,
+        wins=reader.numbers("I", n_players),
+        losses=reader.numbers("I", n_players),
+        levels=reader.numbers("I", n_players),
+        ratings=reader.numbers("d", n_players),
+        rds=reader.numbers("d", n_players)
+    )
+
+    names = reader.strings(n_teams)
+    roles = reader.strings(n_teams)
+    wins = reader.numbers("I", n_teams)
+    losses = reader.numbers("I", n_teams)
+    counts = reader.numbers("I", n_teams)
+    members = iter(reader.strings(sum(counts)))
+    teams = {}
+    for name, role, w, l, count in zip(names, roles, wins, losses, counts):
+        teams[name] = {
+            "members": [next(members) for _ in range(count)],
+            "wins": w,
+            "losses": l,
+            "role": role or None
+        }
+    return players, teams
+
+
+def read_snapshot(path: str):
+    """Decode a snapshot file through a read-only memory map"""
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return decode_snapshot(mapped)
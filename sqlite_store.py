@@ -0,0 +1,276 @@
+import json
+import os
+import sqlite3
+
+from player_store import win_rate
+from ratings import RATING_RD_START, RATING_START, skill
+
+
+# ---------------- Schema ---------------- #
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS players (
+    id       TEXT PRIMARY KEY,
+    username TEXT NOT NULL,
+    wins     INTEGER NOT NULL DEFAULT 0,
+    losses   INTEGER NOT NULL DEFAULT 0,
+    win_rate REAL NOT NULL DEFAULT 0,
+    team     TEXT,
+    rating   REAL NOT NULL DEFAULT 1500,
+    rd       REAL NOT NULL DEFAULT 350,
+    skill    REAL NOT NULL DEFAULT 800   -- rating - 2 * rd
+);
+CREATE TABLE IF NOT EXISTS teams (
+    name   TEXT PRIMARY KEY,
+    role   TEXT,
+    wins   INTEGER NOT NULL DEFAULT 0,
+    losses INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS team_members (
+    team      TEXT NOT NULL,
+    player_id TEXT NOT NULL,
+    position  INTEGER NOT NULL,
+    PRIMARY KEY (team, player_id)
+);
+CREATE TABLE IF NOT EXISTS training_levels (
+    player_id TEXT PRIMARY KEY,
+    level     INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS matches (
+    id      INTEGER PRIMARY KEY,
+    ts      REAL NOT NULL,
+    winner  TEXT NOT NULL,
+    loser   TEXT NOT NULL,
+    winners TEXT NOT NULL,  -- JSON list of player ids
+    losers  TEXT NOT NULL
+);
+"""
+
+# Columns added after the first release; ALTERed into older databases
+_ADDED_COLUMNS = {
+    "players": [
+        ("rating", "REAL NOT NULL DEFAULT 1500"),
+        ("rd", "REAL NOT NULL DEFAULT 350"),
+        ("skill", "REAL NOT NULL DEFAULT 800")
+    ]
+}
+
+INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_players_username ON players (username COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_players_team ON players (team, win_rate DESC);
+CREATE INDEX IF NOT EXISTS idx_players_win_rate ON players (win_rate DESC, username);
+CREATE INDEX IF NOT EXISTS idx_team_members_player ON team_members (player_id);
+CREATE INDEX IF NOT EXISTS idx_players_skill ON players (skill DESC, username);
+CREATE INDEX IF NOT EXISTS idx_players_team_skill ON players (team, skill DESC);
+"""
+
+# ORDER BY clause for each ranking the queries support
+_ORDERS = {
+    "win_rate": "p.win_rate DESC, p.username",
+    "rating": "p.skill DESC, p.username"
+}
+
+
+# ---------------- SQLite Store ---------------- #
+class SqliteStore:
+    """players / teams / team_members / training_levels tables behind the stats.json layout,
+    plus the append-only matches history.
+
+    The bot still works on the in-memory dicts; this store receives the same
+    changed entries the journal would and answers the heavier read queries.
+    All calls after load() come from the persistence worker thread.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        for table, columns in _ADDED_COLUMNS.items():
+            existing = {row[1] for row in self.conn.execute(f"PRAGMA table_info({table})")}
+            for name, decl in columns:
+                if name not in existing:
+                    self.conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+        self.conn.executescript(INDEXES)
+
+    def close(self):
+        self.conn.close()
+
+    def is_empty(self) -> bool:
+        row = self.conn.execute(
+            "SELECT (SELECT COUNT(*) FROM players) + (SELECT COUNT(*) FROM teams)"
+        ).fetchone()
+        return row[0] == 0
+
+    def load(self):
+        """Read everything back in the stats.json layout"""
+        data = {"players": {}, "TEAMS": {}, "training_levels": {}}
+        for player_id, username, wins, losses, team, rating, rd in self.conn.execute(
+            "SELECT id, username, wins, losses, team, rating, rd FROM players ORDER BY rowid"
+        ):
+            data["players"][player_id] = {
+                "username": username,
+                "wins": wins,
+                "losses": losses,
+                "team": team,
+                "rating": rating,
+                "rd": rd
+            }
+        for name, role, wins, losses in self.conn.execute(
+            "SELECT name, role, wins, losses FROM teams ORDER BY rowid"
+        ):
+            data["TEAMS"][name] = {"members": [], "wins": wins, "losses": losses, "role": role}
+        for team, player_id in self.conn.execute(
+            "SELECT team, player_id FROM team_members ORDER BY team, position"
+        ):
+            if team in data["TEAMS"]:
+                data["TEAMS"][team]["members"].append(player_id)
+        for player_id, level in self.conn.execute("SELECT player_id, level FROM training_levels"):
+            data["training_levels"][player_id] = level
+        return data
+
+    # -------- writes -------- #
+    def _put_player(self, player_id, record):
+        wins = record.get("wins", 0)
+        losses = record.get("losses", 0)
+        rating = record.get("rating", RATING_START)
+        rd = record.get("rd", RATING_RD_START)
+        self.conn.execute(
+            "INSERT INTO players (id, username, wins, losses, win_rate, team, rating, rd, skill) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET username=excluded.username, wins=excluded.wins, "
+            "losses=excluded.losses, win_rate=excluded.win_rate, team=excluded.team, "
+            "rating=excluded.rating, rd=excluded.rd, skill=excluded.skill",
+            (player_id, record["username"], wins, losses, win_rate(wins, losses), record.get("team"),
+             rating, rd, skill(rating, rd))
+        )
+
+    def _put_team(self, name, data):
+        # Upsert rather than REPLACE so the rowid (creation order) survives edits
+        self.conn.execute(
+            "INSERT INTO teams (name, role, wins, losses) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET role=excluded.role, wins=excluded.wins, losses=excluded.losses",
+            (name, data.get("role"), data.get("wins", 0), data.get("losses", 0))
+        )
+        self.conn.execute("DELETE FROM team_members WHERE team = ?", (name,))
+        self.conn.executemany(
+            "INSERT INTO team_members (team, player_id, position) VALUES (?, ?, ?)",
+            [(name, player_id, i) for i, player_id in enumerate(data.get("members", []))]
+        )
+
+    def _put_level(self, player_id, level):
+        self.conn.execute(
+            "INSERT INTO training_levels (player_id, level) VALUES (?, ?) "
+            "ON CONFLICT(player_id) DO UPDATE SET level=excluded.level",
+            (player_id, level)
+        )
+
+    def _insert_matches(self, events):
+        self.conn.executemany(
+            "INSERT INTO matches (id, ts, winner, loser, winners, losers) VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (e["id"], e["ts"], e["winner"], e["loser"], json.dumps(e["winners"]), json.dumps(e["losers"]))
+                for e in events
+            ]
+        )
+
+    def append_matches(self, events):
+        with self.conn:
+            self._insert_matches(events)
+
+    def apply(self, entries, events=()):
+        """Apply journal-style entries, and any new match events, in a single transaction"""
+        with self.conn:
+            self._insert_matches(events)
+            for entry in entries:
+                table, key = entry["table"], entry["key"]
+                deleted = entry.get("deleted", False)
+                if table == "players":
+                    if deleted:
+                        self.conn.execute("DELETE FROM players WHERE id = ?", (key,))
+                    else:
+                        self._put_player(key, entry["value"])
+                elif table == "TEAMS":
+                    if deleted:
+                        self.conn.execute("DELETE FROM teams WHERE name = ?", (key,))
+                        self.conn.execute("DELETE FROM team_members WHERE team = ?", (key,))
+                    else:
+                        self._put_team(key, entry["value"])
+                elif table == "training_levels":
+                    if deleted:
+                        self.conn.execute("DELETE FROM training_levels WHERE player_id = ?", (key,))
+                    else:
+                        self._put_level(key, entry["value"])
+
+    def import_data(self, data):
+        """Bulk-load a stats.json style dict"""
+        entries = []
+        for table in ("players", "TEAMS", "training_levels"):
+            for key, value in data.get(table, {}).items():
+                entries.append({"table": table, "key": key, "value": value})
+        self.apply(entries)
+
+    # -------- queries -------- #
+    def match_count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM matches").fetchone()[0]
+
+    def match_totals(self):
+        """(highest match id, number of matches), 0 for both when there are none"""
+        last_id, count = self.conn.execute("SELECT MAX(id), COUNT(*) FROM matches").fetchone()
+        return last_id or 0, count
+
+    def matches(self):
+        """Every match event, oldest first"""
+        return [
+            {"id": match_id, "ts": ts, "winner": winner, "loser": loser,
+             "winners": json.loads(winners), "losers": json.loads(losers)}
+            for match_id, ts, winner, loser, winners, losers in self.conn.execute(
+                "SELECT id, ts, winner, loser, winners, losers FROM matches ORDER BY id"
+            )
+        ]
+
+    def ranked_players(self, limit: int = -1, offset: int = 0, order: str = "win_rate"):
+        """(id, username, wins, losses, win_rate, rating, rd) for every player, best first"""
+        return self.conn.execute(
+            "SELECT p.id, p.username, p.wins, p.losses, p.win_rate, p.rating, p.rd FROM players p "
+            f"ORDER BY {_ORDERS[order]} LIMIT ? OFFSET ?",
+            (limit, offset)
+        ).fetchall()
+
+    def team_ranking(self, team: str, limit: int = -1, offset: int = 0, order: str = "win_rate"):
+        """(id, username, wins, losses, win_rate, rating, rd) for one team's members, best first"""
+        return self.conn.execute(
+            "SELECT p.id, p.username, p.wins, p.losses, p.win_rate, p.rating, p.rd "
+            "FROM team_members m JOIN players p ON p.id = m.player_id "
+            f"WHERE m.team = ? ORDER BY {_ORDERS[order]} LIMIT ? OFFSET ?",
+            (team, limit, offset)
+        ).fetchall()
+
+    def team_roster_by_level(self, team: str):
+        """(level, username, wins, losses, win_rate) for one team, grouped by level"""
+        return self.conn.execute(
+            "SELECT COALESCE(t.level, 0), p.username, p.wins, p.losses, p.win_rate "
+            "FROM team_members m JOIN players p ON p.id = m.player_id "
+            "LEFT JOIN training_levels t ON t.player_id = m.player_id "
+            "WHERE m.team = ? ORDER BY COALESCE(t.level, 0), m.position",
+            (team,)
+        ).fetchall()
+
+
+# ---------------- Migration ---------------- #
+def migrate_from_json(json_path: str, db_path: str):
+    """One-shot copy of an existing stats.json into a SQLite database"""
+    with open(json_path, "r") as f:
+        data = json.load(f)
+    store = SqliteStore(db_path)
+    store.import_data(data)
+    return store
+
+
+if __name__ == "__main__":
+    import sys
+
+    source = sys.argv[1] if len(sys.argv) > 1 else "stats.json"
+    target = sys.argv[2] if len(sys.argv) > 2 else os.getenv("DATABASE_FILE", "stats.db")
+    migrate_from_json(source, target)
+    print(f"Migrated {source} -> {target}")
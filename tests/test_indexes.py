@@ -0,0 +1,42 @@
+import random
+
+from indexes import NameIndex
+
+
+def brute_force(names, query):
+    q = query.lower()
+    return [key for key, name in names.items() if q in name.lower()]
+
+
+def test_search_matches_a_scan():
+    rng = random.Random(7)
+    alphabet = "abcde Ää_1"
+    names = {}
+    index = NameIndex()
+    for i in range(400):
+        key = str(i)
+        names[key] = "".join(rng.choice(alphabet) for _ in range(rng.randint(1, 9)))
+        index.add(key, names[key])
+    # Renames and removals go through the same index paths
+    for key in rng.sample(sorted(names), 60):
+        names[key] = "".join(rng.choice(alphabet) for _ in range(rng.randint(1, 9)))
+        index.add(key, names[key])
+    for key in rng.sample(sorted(names), 40):
+        del names[key]
+        index.remove(key)
+
+    queries = {name[start:start + size] for name in names.values()
+               for start in range(len(name)) for size in (1, 2, 3, 5)}
+    queries |= {"zz", "abcabc", "Ä", "A B"}
+    for query in queries:
+        assert index.search(query) == brute_force(names, query), query
+
+
+def test_exact_and_complete():
+    index = NameIndex()
+    for key, name in (("1", "bobby"), ("2", "Bob"), ("3", "alice"), ("4", "bobcat")):
+        index.add(key, name)
+    assert index.exact("BOB") == ["2"]
+    assert index.exact("bo") == []
+    assert index.complete("bob") == ["2", "1", "4"]   # name order
+    assert index.complete("bob", limit=1) == ["2"]
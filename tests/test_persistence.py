@@ -0,0 +1,91 @@
+import json
+
+import pytest
+
+import persistence
+from indexes import members_from_list, members_to_list
+from persistence import PersistenceService, state_to_data
+from player_store import Player, PlayerStore
+
+
+def open_shard(directory):
+    """A service bound to freshly loaded state, the way League wires it up"""
+    service = PersistenceService(str(directory), delay=0)
+    players, teams = service.load_state()
+    for team in teams.values():
+        members_from_list(team)
+    service.bind({"players": players, "TEAMS": teams, "training_levels": players.training_levels},
+                 encoders={"TEAMS": members_to_list, "players": Player.to_dict, "training_levels": int})
+    return service, players, teams
+
+
+def on_disk(players, teams):
+    return state_to_data(players, {name: members_to_list(team) for name, team in teams.items()})
+
+
+def mutate(service, players, teams):
+    # Outside an event loop every record() is written straight away
+    teams["Blue"] = {"members": {}, "wins": 0, "losses": 0, "role": "Blue"}
+    service.record("TEAMS", "Blue")
+    for player_id, name in (("10", "ädam"), ("11", "bea"), ("12", "cy")):
+        players.add(player_id, name, team="Blue", level=1)
+        teams["Blue"]["members"][player_id] = None
+        service.record("training_levels", player_id)
+        service.record("players", player_id)
+    service.record("TEAMS", "Blue")
+    players["10"].wins = 7
+    players["11"].rating = 1712.5
+    service.record("players", "10")
+    service.record("players", "11")
+    players.training_levels["12"] = 2
+    service.record("training_levels", "12")
+    players.pop("11")
+    del teams["Blue"]["members"]["11"]
+    service.record("players", "11")
+    service.record("TEAMS", "Blue")
+    teams.pop("Red")
+    service.record("TEAMS", "Red")
+
+
+@pytest.fixture
+def shard(tmp_path):
+    players = PlayerStore()
+    players.add("1", "Ann", wins=2, losses=1, team="Red", level=1)
+    players.add("2", "Bob", team=None)
+    teams = {"Red": {"members": ["1"], "wins": 1, "losses": 0, "role": "Red"}}
+    (tmp_path / persistence.DATA_FILE).write_text(json.dumps(state_to_data(players, teams)))
+    return tmp_path
+
+
+def test_journal_replay_matches_live_state(shard):
+    service, players, teams = open_shard(shard)
+    mutate(service, players, teams)
+    _, reloaded_players, reloaded_teams = open_shard(shard)
+    assert on_disk(reloaded_players, reloaded_teams) == on_disk(players, teams)
+
+
+@pytest.mark.parametrize("fmt", ["binary", "json"])
+def test_compaction_keeps_state(shard, monkeypatch, fmt):
+    monkeypatch.setattr(persistence, "SNAPSHOT_FORMAT", fmt)
+    service, players, teams = open_shard(shard)
+    mutate(service, players, teams)
+    service._compact()
+    assert not (shard / persistence.JOURNAL_FILE).exists()
+    assert (shard / persistence.SNAPSHOT_FILE).exists() == (fmt == "binary")
+    assert (shard / persistence.DATA_FILE).exists() == (fmt == "json")
+    _, reloaded_players, reloaded_teams = open_shard(shard)
+    assert on_disk(reloaded_players, reloaded_teams) == on_disk(players, teams)
+
+
+def test_torn_journal_line_is_skipped(shard):
+    service, players, teams = open_shard(shard)
+    mutate(service, players, teams)
+    with open(shard / persistence.JOURNAL_FILE, "a") as f:
+        f.write('{"table": "players", "key": "1", "val')
+    _, reloaded_players, reloaded_teams = open_shard(shard)
+    assert on_disk(reloaded_players, reloaded_teams) == on_disk(players, teams)
+
+
+def test_negative_counts_from_old_files_are_clamped():
+    players = PlayerStore.from_data({"1": {"username": "old", "wins": -2, "losses": 3}}, {})
+    assert (players["1"].wins, players["1"].losses) == (0, 3)
@@ -0,0 +1,66 @@
+import pytest
+
+from persistence import state_to_data
+from player_store import PlayerStore
+from snapshot import decode_snapshot, encode_snapshot, read_snapshot
+
+
+def build_players():
+    players = PlayerStore()
+    players.add("1", "Zoë", wins=3, losses=1, team="Ærø", level=2, rating=1612.25, rd=80.5)
+    players.add("2", "名前🙂", wins=0, losses=7, team=None, level=0)
+    players.add("3", "école", wins=4294967295, losses=0, team="Ærø", level=1, rating=-3.5, rd=350.0)
+    return players
+
+
+def round_trip(players, teams):
+    return decode_snapshot(encode_snapshot(players, teams))
+
+
+def test_round_trip_keeps_every_field():
+    players = build_players()
+    teams = {
+        "Ærø": {"members": ["1", "3"], "wins": 5, "losses": 2, "role": "Ærø Rôle"},
+        "🙂 squad": {"members": [], "wins": 0, "losses": 0, "role": "squad"}
+    }
+    decoded_players, decoded_teams = round_trip(players, teams)
+    assert state_to_data(decoded_players, decoded_teams) == state_to_data(players, teams)
+    assert list(decoded_players.ids) == players.ids
+    assert list(decoded_players.ratings) == list(players.ratings)   # exact, not the rounded JSON form
+    assert dict(decoded_players.training_levels.items()) == {"1": 2, "2": 0, "3": 1}
+
+
+def test_round_trip_empty_league():
+    players, teams = round_trip(PlayerStore(), {})
+    assert len(players) == 0
+    assert teams == {}
+
+
+def test_teams_without_a_role():
+    teams = {"a": {"members": ["1"], "wins": 1, "losses": 0}, "b": {"members": [], "role": None}}
+    _, decoded = round_trip(build_players(), teams)
+    assert decoded == {
+        "a": {"members": ["1"], "wins": 1, "losses": 0, "role": None},
+        "b": {"members": [], "wins": 0, "losses": 0, "role": None}
+    }
+
+
+def test_members_as_ordered_dicts():
+    # Live leagues keep members as an ordered set (dict); order must survive
+    teams = {"a": {"members": dict.fromkeys(["3", "1"]), "wins": 0, "losses": 0, "role": "a"}}
+    _, decoded = round_trip(build_players(), teams)
+    assert decoded["a"]["members"] == ["3", "1"]
+
+
+def test_read_snapshot_file(tmp_path):
+    path = tmp_path / "stats.snap"
+    path.write_bytes(encode_snapshot(build_players(), {}))
+    players, teams = read_snapshot(str(path))
+    assert state_to_data(players, teams) == state_to_data(build_players(), {})
+
+
+def test_rejects_foreign_and_truncated_data():
+    with pytest.raises(ValueError):
+        decode_snapshot(b"{\"players\": {}}")
+    with pytest.raises(ValueError):
+        decode_snapshot(encode_snapshot(build_players(), {})[:-3])
@@ -0,0 +1,92 @@
+import asyncio
+
+
+# ---------------- Lock Table ---------------- #
+class LockTable:
+    """One asyncio.Lock per key, created on demand and dropped once nobody holds or waits on it.
+
+    Keys are ("team", name) or ("player", id) tuples. A set of keys is
+    always taken in sorted order, so two commands that need overlapping
+    sets can never deadlock on each other.
+    """
+
+    def __init__(self):
+        self._locks = {}
+        self._users = {}    # key -> holders + waiters
+
+    def __len__(self):
+        return len(self._locks)
+
+    def locked(self, key) -> bool:
+        lock = self._locks.get(key)
+        return lock is not None and lock.locked()
+
+    async def acquire(self, keys):
+        keys = sorted(set(keys))
+        for key in keys:
+            if key not in self._locks:
+                self._locks[key] = asyncio.Lock()
+            self._users[key] = self._users.get(key, 0) + 1
+        held = 0
+        try:
+            for key in keys:
+                await self._locks[key].acquire()
+                held += 1
+        except BaseException:
+            self._release(keys, held)
+            raise
+        return keys
+
+    def release(self, keys):
+        self._release(keys, len(keys))
+
+    def _release(self, keys, held):
+        for i, key in enumerate(keys):
+            if i < held:
+                self._locks[key].release()
+            self._users[key] -= 1
+            if not self._users[key]:
+                del self._users[key]
+                del self._locks[key]
+
+
+# ---------------- Unit of Work ---------------- #
+class UnitOfWork:
+    """Locks the teams and players a command touches and commits its changes in one step.
+
+        async with league.unit(teams=[team], players=[player_id]) as unit:
+            ...validate, await Discord...
+            unit.stage(league.store_new_player, user, team, level)
+
+    Staged calls run back to back, with no await in between, only when the
+    block exits cleanly, followed by a single persistence flush; if the
+    block raises, nothing is applied. Their return values end up in
+    `results`. Commands touching other teams and players never wait on
+    this one.
+    """
+
+    def __init__(self, league, teams=(), players=()):
+        self.league = league
+        self._keys = [("team", name) for name in teams if name is not None]
+        self._keys += [("player", player_id) for player_id in players]
+        self._staged = []
+        self._held = None
+        self.results = []
+
+    async def __aenter__(self):
+        self._held = await self.league.locks.acquire(self._keys)
+        return self
+
+    def stage(self, fn, *args):
+        """Queue a mutation to apply at commit time"""
+        self._staged.append((fn, args))
+
+    async def __aexit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None and self._staged:
+                for fn, args in self._staged:
+                    self.results.append(fn(*args))
+                await self.league.service.flush()
+        finally:
+            self.league.locks.release(self._held)
+        return False